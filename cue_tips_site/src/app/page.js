@@ -18,6 +18,8 @@ const Home = () => {
       // Send cue_angle to /sim endpoint for simulation
       const response = await axios.post('http://localhost:4000/sim', {
         cue_angle: cueAngle,  // Send the cue angle value
+        session_id: sessionStorage.getItem('cueTipsSession'),  // Table uploaded by this browser
+        seed: 0,  // Same angle gives the same path, so the server can reuse it
       });
 
       if (response.status === 200) {
@@ -56,7 +56,7 @@ const Camera = ({ svgContent }) => {
 
     try {
       setIsUploading(true);
-      const response = await axios.post('http://localhost:4000/upload', formData, {
+      const response = await axios.post('http://localhost:4000/upload?output=svg', formData, {
         headers: {
           'Content-Type': 'multipart/form-data'
         }
@@ -65,7 +65,8 @@ const Camera = ({ svgContent }) => {
       const data = await response.data;
 
       if (response.status === 200) {
-        setUploadedImage(data.image); 
+        setUploadedImage(data.svg); 
+        sessionStorage.setItem('cueTipsSession', data.session_id);
       } else {
         alert('Error uploading image: ' + data);
       }
@@ -91,7 +92,7 @@ const Camera = ({ svgContent }) => {
       {uploadedImage && !isStreaming && (
         <div className="absolute top-[42%] left-1/2 transform -translate-x-1/2 -translate-y-1/2 w-[80%] sm:w-[60%]">        
           <img
-            src={`data:image/png;base64,${uploadedImage}`}
+            src={`data:image/svg+xml;charset=utf-8,${encodeURIComponent(uploadedImage)}`}
             alt="Processed"
             className="mx-auto rounded-lg"
           />
@@ -0,0 +1,152 @@
+import cv2
+import numpy as np
+from TableState import TableState
+from Cartoonify import detectCircles, sampleBallColors
+from Metrics import timed
+
+KEYFRAME_INTERVAL = 30  # Run a full Hough detection at least every N frames
+SEARCH_RADIUS = 12  # Pixels a ball may move between two frames and still be tracked locally
+MATCH_THRESHOLD = 0.25  # Worst TM_SQDIFF_NORMED score accepted for a local match
+MOTION_LEVELS = 2  # Frame differencing runs on the frame after this many pyrDown halvings
+MOTION_PIXEL_DELTA = 25  # Grey-level change that counts a pixel as moving
+MOTION_BALL_FRACTION = 0.25  # Moving area outside tracked balls, in ball areas, that forces a keyframe
+
+
+class BallTracker:
+    """
+    Keeps ball identities across frames of the same table.
+
+    Keyframes run the full HoughCircles detection and match the new circles to
+    the existing tracks by distance. In between, every ball is relocated with
+    template matching in a small window around its last position, which costs a
+    few ball-sized patches instead of a full-frame Hough transform. A keyframe
+    is forced when the frame changes outside the tracked balls (a ball appeared,
+    the camera moved) or when a ball can no longer be found locally.
+    """
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL, search_radius=SEARCH_RADIUS,
+                 match_threshold=MATCH_THRESHOLD):
+        self.keyframe_interval = keyframe_interval
+        self.search_radius = search_radius
+        self.match_threshold = match_threshold
+        self.tracks = []
+        self.avg_radius = 0
+        self.frames = 0
+        self.keyframes = 0
+        self._next_id = 0
+        self._since_keyframe = 0
+        self._motion_ref = None
+
+    def reset(self):
+        self.tracks = []
+        self._motion_ref = None
+        self._since_keyframe = 0
+
+    def update(self, img, pyramid=False, edges=None):
+        """
+        Locate the balls in a bird's-eye frame.
+
+        Args:
+            img (numpy array): Warped BGR table image.
+            pyramid (bool | str): Pyramid setting used for keyframe detection.
+            edges (List, optional): Rail edges attached to the returned table.
+
+        Returns:
+            tuple: (TableState, keyframe) where keyframe says whether full
+            detection ran for this frame.
+        """
+        self.frames += 1
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        small = gray
+        for _ in range(MOTION_LEVELS):
+            small = cv2.pyrDown(small)
+
+        keyframe = (
+            not self.tracks
+            or self._motion_ref is None
+            or self._motion_ref.shape != small.shape
+            or self._since_keyframe >= self.keyframe_interval
+            or self._motion_outside_tracks(small)
+            or not self._track_locally(gray)
+        )
+        if keyframe:
+            self._detect(img, gray, pyramid)
+            self._since_keyframe = 0
+            self.keyframes += 1
+        else:
+            self._since_keyframe += 1
+
+        self._motion_ref = small
+        return self.table_state(edges), keyframe
+
+    def table_state(self, edges=None):
+        """The tracked balls, with their IDs, as a TableState."""
+        tracks = self.tracks
+        return TableState([(t["x"], t["y"]) for t in tracks], [t["color"] for t in tracks], edges, self.avg_radius,
+                          radii=[t["r"] for t in tracks], ids=[t["id"] for t in tracks])
+
+    def _motion_outside_tracks(self, small):
+        scale = 0.5 ** MOTION_LEVELS
+        moving = cv2.absdiff(small, self._motion_ref) > MOTION_PIXEL_DELTA
+        for track in self.tracks:
+            half = int((track["r"] + self.search_radius) * scale) + 1
+            x, y = int(track["x"] * scale), int(track["y"] * scale)
+            moving[max(0, y - half):y + half + 1, max(0, x - half):x + half + 1] = False
+        ball_area = np.pi * (self.avg_radius * scale) ** 2
+        return np.count_nonzero(moving) > MOTION_BALL_FRACTION * ball_area
+
+    @timed("track")
+    def _track_locally(self, gray):
+        """Move every track to its best template match nearby; False if any ball is lost."""
+        height, width = gray.shape[:2]
+        moved = []
+        for track in self.tracks:
+            template = track["template"]
+            half = track["r"] + self.search_radius
+            x0, y0 = max(0, track["x"] - half), max(0, track["y"] - half)
+            x1, y1 = min(width, track["x"] + half + 1), min(height, track["y"] + half + 1)
+            window = gray[y0:y1, x0:x1]
+            if window.shape[0] < template.shape[0] or window.shape[1] < template.shape[1]:
+                return False
+
+            scores = cv2.matchTemplate(window, template, cv2.TM_SQDIFF_NORMED)
+            score, _, (mx, my), _ = cv2.minMaxLoc(scores)
+            if score > self.match_threshold:
+                return False
+            moved.append((x0 + mx + template.shape[1] // 2, y0 + my + template.shape[0] // 2))
+
+        for track, (x, y) in zip(self.tracks, moved):
+            track["x"], track["y"] = int(x), int(y)
+        return True
+
+    def _detect(self, img, gray, pyramid):
+        """Full Hough detection; circles inherit the ID of the nearest previous track."""
+        circles = detectCircles(img, pyramid=pyramid)
+        if circles is None:
+            self.tracks = []
+            return
+
+        circles = np.round(circles[0, :]).astype("int")
+        min_radius = circles[:, 2].min()
+        self.avg_radius = int(circles[:, 2].mean())
+        balls = circles[circles[:, 2] <= min_radius * 2]  # Same large-circle filter as plotCircles
+        mean_colors = sampleBallColors(img, balls)["mean"]
+
+        previous = {t["id"]: (t["x"], t["y"]) for t in self.tracks}
+        max_jump = 2 * self.avg_radius + self.search_radius
+        tracks = []
+        for (x, y, r), mean_color in zip(balls, mean_colors):
+            ball_id = None
+            if previous:
+                nearest = min(previous, key=lambda i: np.hypot(previous[i][0] - x, previous[i][1] - y))
+                if np.hypot(previous[nearest][0] - x, previous[nearest][1] - y) <= max_jump:
+                    ball_id = nearest
+                    del previous[nearest]
+            if ball_id is None:
+                ball_id = self._next_id
+                self._next_id += 1
+
+            template = gray[max(0, y - r):y + r + 1, max(0, x - r):x + r + 1].copy()
+            tracks.append({"id": ball_id, "x": int(x), "y": int(y), "r": int(r),
+                           "color": tuple(map(int, mean_color[:3])), "template": template})
+        self.tracks = tracks
@@ -0,0 +1,181 @@
+"""
+Headless table analysis over many images at once.
+
+    python BatchPipeline.py recordings/match1/ extra.png --workers 8 > tables.jsonl
+
+Each image becomes one JSON line with its balls, rail edges and ball radius (or
+an error); a final {"summary": ...} line reports images/sec.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import cv2
+
+from TableState import NO_ID
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+
+def table_to_json(table):
+    """A TableState's ball positions, colours and IDs, rail edges and radius as plain JSON types."""
+    balls = []
+    for (x, y), color, ball_id in zip(table.positions.astype(int).tolist(), table.colors.tolist(), table.ids.tolist()):
+        entry = {"x": x, "y": y, "color": color}
+        if ball_id != NO_ID:
+            entry["id"] = ball_id
+        balls.append(entry)
+    return {
+        "balls": balls,
+        "edges": [[list(point) for point in edge] for edge in table.edges] if table.edges is not None else None,
+        "radius": table.radius,
+    }
+
+
+def list_images(sources):
+    """Expand directories (non-recursively, sorted) into their image files; files are kept as given."""
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(os.path.join(source, name) for name in sorted(os.listdir(source))
+                          if name.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.append(source)
+    return paths
+
+
+def _init_worker():
+    from Warmup import warm_cv
+
+    cv2.setNumThreads(1)  # Parallelism comes from the pool, not from OpenCV inside each worker
+    try:
+        warm_cv()
+    except Exception:
+        pass
+
+
+def analyse_image(name, data=None, pyramid="auto"):
+    """
+    Run the headless pipeline on one image, read from the path name unless its
+    encoded bytes are given.
+
+    Returns:
+        dict: "image" plus table_to_json fields and "ms", or "error".
+    """
+    from main import getCueTips
+    from ImageIO import decode_image, frame_buffers
+
+    start = time.perf_counter()
+    try:
+        if data is None:
+            with open(name, "rb") as f:
+                data = f.read()
+        with frame_buffers.lease():
+            _, _, _, table = getCueTips(decode_image(data), run_sim=False, pyramid=pyramid, render=False)
+        result = {"image": name, **table_to_json(table)}
+    except Exception as e:
+        result = {"image": name, "error": str(e)}
+    result["ms"] = round((time.perf_counter() - start) * 1000.0, 2)
+    return result
+
+
+class BatchRunner:
+    """
+    Process pool for batch analysis. At most max_in_flight images are queued or
+    being processed at any time, so memory stays bounded however many images
+    a batch has; results are yielded as they complete.
+    """
+
+    def __init__(self, workers=None, max_in_flight=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        return self._executor
+
+    def run(self, items, pyramid="auto"):
+        """
+        Analyse (name, data) pairs, where data may be None to read name from disk
+        or a callable returning the bytes (called only when the image is submitted).
+
+        Yields:
+            dict: One analyse_image result per item, then {"summary": ...}.
+        """
+        executor = self.start()
+        start = time.perf_counter()
+        done_count = failed = 0
+        in_flight = set()
+        items = iter(items)
+        exhausted = False
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < self.max_in_flight:
+                item = next(items, None)
+                if item is None:
+                    exhausted = True
+                    break
+                name, data = item
+                in_flight.add(executor.submit(analyse_image, name, data() if callable(data) else data, pyramid))
+            if not in_flight:
+                break
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                done_count += 1
+                failed += "error" in result
+                yield result
+
+        seconds = time.perf_counter() - start
+        yield {"summary": {
+            "images": done_count,
+            "failed": failed,
+            "seconds": round(seconds, 3),
+            "images_per_s": round(done_count / seconds, 2) if seconds > 0 else None,
+            "workers": self.workers,
+        }}
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", help="Image files and/or directories of images")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Images queued or processing at once (default: 2 x workers)")
+    parser.add_argument("--pyramid", default="auto", choices=["true", "false", "auto"])
+    parser.add_argument("--out", help="Write JSON lines here instead of stdout")
+    args = parser.parse_args(argv)
+
+    pyramid = {"true": True, "false": False}.get(args.pyramid, "auto")
+    runner = BatchRunner(args.workers, args.max_in_flight)
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        for result in runner.run(((path, None) for path in list_images(args.sources)), pyramid=pyramid):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            if "summary" in result:
+                summary = result["summary"]
+                print(f"{summary['images']} images ({summary['failed']} failed) in {summary['seconds']} s, "
+                      f"{summary['images_per_s']} images/s", file=sys.stderr)
+    finally:
+        runner.close()
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
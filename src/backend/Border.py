@@ -1,5 +1,10 @@
 import cv2
 import numpy as np
+from ImageIO import frame_buffers
+
+MIN_LINE_LENGTH = 50
+MAX_LINE_GAP = 15
+MIN_RAIL_LENGTH = 100
 
 def enhanced_rail_detection(image):
     """
@@ -12,7 +17,7 @@ def enhanced_rail_detection(image):
         list: Detected inside rail edges
     """
     # Convert to grayscale and preprocess
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=frame_buffers.get(image.shape[:2]))
     clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
     equalized = clahe.apply(gray)
     denoised = cv2.bilateralFilter(equalized, 9, 75, 75)
@@ -28,8 +33,8 @@ def enhanced_rail_detection(image):
         rho=1,
         theta=np.pi / 180,
         threshold=80,  # Higher threshold for more robust detection
-        minLineLength=50,
-        maxLineGap=15
+        minLineLength=MIN_LINE_LENGTH,
+        maxLineGap=MAX_LINE_GAP
     )
 
     rail_lines = []
@@ -38,7 +43,7 @@ def enhanced_rail_detection(image):
             x1, y1, x2, y2 = line[0]
             length = np.sqrt((x2 - x1)**2 + (y2 - y1)**2)
             angle = np.abs(np.arctan2(y2 - y1, x2 - x1) * 180 / np.pi)
-            if length > 100 and (angle < 15 or 75 < angle < 105 or angle > 165):
+            if length > MIN_RAIL_LENGTH and (angle < 15 or 75 < angle < 105 or angle > 165):
                 rail_lines.append((x1, y1, x2, y2))
 
     return rail_lines
@@ -182,7 +187,6 @@ def getBorder(image):
     
     # Detect inside rail edges
     rail_lines = enhanced_rail_detection(image)
-    print("HERE")
     # Get the main inside table edges
     edges = get_inside_table_edges(rail_lines)
     edges_formated = draw_inside_border(image, edges)
@@ -0,0 +1,157 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from ImageTo2d import perspective_for_corners, get_prominent_color, felt_hsv_range
+
+VALIDATION_STRIDE = 8  # Sample every Nth pixel when re-validating a profile
+FELT_TOLERANCE = 0.1  # Allowed change in any felt-coverage score before recalibrating
+RAIL_STRIP = 6  # Width in pixels of the strips checked on either side of a rail
+MAX_PROFILES = 8  # Profiles kept in memory; each holds ~15 MB of remap tables for a 2000 px frame
+
+
+class CalibrationProfile:
+    """
+    Everything about a fixed camera over a fixed table that does not change
+    between frames: the padded corners, the perspective matrix and its
+    precomputed remap tables, the rail edges and a felt-coverage baseline.
+    """
+
+    def __init__(self, camera_id, corners, frame_size, edges, felt_hsv, baseline=None):
+        self.camera_id = camera_id
+        self.corners = np.asarray(corners, dtype=np.float32)
+        self.frame_size = tuple(int(v) for v in frame_size)
+        self.edges = [[tuple(int(v) for v in point) for point in edge] for edge in edges]
+        self.felt_hsv = np.asarray(felt_hsv, dtype=np.uint8)
+        self.matrix, self.output_size = perspective_for_corners(self.corners)
+        self.map1, self.map2 = self._build_maps()
+        self.baseline = baseline
+
+    def _build_maps(self):
+        """Fixed-point remap tables equivalent to warpPerspective with self.matrix."""
+        width, height = self.output_size
+        grid = np.mgrid[0:height, 0:width].astype(np.float32)
+        points = np.stack([grid[1], grid[0]], axis=-1).reshape(-1, 1, 2)
+        source = cv2.perspectiveTransform(points, np.linalg.inv(self.matrix)).reshape(height, width, 2)
+        return cv2.convertMaps(source[..., 0], source[..., 1], cv2.CV_16SC2)
+
+    def matches(self, image):
+        return image is not None and image.shape[1::-1] == self.frame_size
+
+    def warp(self, image, dst=None):
+        return cv2.remap(image, self.map1, self.map2, cv2.INTER_LINEAR, dst=dst)
+
+    def felt_scores(self, warped):
+        """
+        Felt coverage inside the rails and in a thin strip just outside each
+        rail, sampled on a sparse grid so a check costs a few thousand pixels.
+
+        Returns:
+            tuple: (inside, top, bottom, left, right) coverage fractions.
+        """
+        lower_hsv, upper_hsv = felt_hsv_range(self.felt_hsv)
+        (left, top), (right, bottom) = self.edges[0][0], self.edges[3][1]
+        height, width = warped.shape[:2]
+
+        def coverage(x0, y0, x1, y1):
+            x0, x1 = max(0, x0), min(width, x1)
+            y0, y1 = max(0, y0), min(height, y1)
+            if x1 <= x0 or y1 <= y0:
+                return 0.0
+            sample = warped[y0:y1:VALIDATION_STRIDE, x0:x1:VALIDATION_STRIDE]
+            mask = cv2.inRange(cv2.cvtColor(sample, cv2.COLOR_BGR2HSV), lower_hsv, upper_hsv)
+            return float(np.count_nonzero(mask)) / mask.size
+
+        return (
+            coverage(left + RAIL_STRIP, top + RAIL_STRIP, right - RAIL_STRIP, bottom - RAIL_STRIP),
+            coverage(left, top - 3 * RAIL_STRIP, right, top - RAIL_STRIP),
+            coverage(left, bottom + RAIL_STRIP, right, bottom + 3 * RAIL_STRIP),
+            coverage(left - 3 * RAIL_STRIP, top, left - RAIL_STRIP, bottom),
+            coverage(right + RAIL_STRIP, top, right + 3 * RAIL_STRIP, bottom),
+        )
+
+    def is_valid(self, warped):
+        """True while every felt-coverage score is within tolerance of calibration time."""
+        if self.baseline is None:
+            return True
+        scores = self.felt_scores(warped)
+        return all(abs(now - then) <= FELT_TOLERANCE for now, then in zip(scores, self.baseline))
+
+
+class CalibrationStore:
+    """
+    Calibration profiles per camera ID, persisted as one .npz file per camera
+    under directory (when one is given). At most max_profiles stay in memory;
+    the least recently used is dropped and reloaded from disk if needed again.
+    """
+
+    def __init__(self, directory=None, max_profiles=MAX_PROFILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, camera_id):
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", str(camera_id))
+        return os.path.join(self.directory, f"{safe}.npz")
+
+    def _remember(self, profile):
+        with self._lock:
+            self._profiles[profile.camera_id] = profile
+            self._profiles.move_to_end(profile.camera_id)
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def get(self, camera_id):
+        with self._lock:
+            profile = self._profiles.get(camera_id)
+            if profile is not None:
+                self._profiles.move_to_end(camera_id)
+        if profile is None and self.directory and os.path.exists(self._path(camera_id)):
+            profile = self._load(camera_id)
+            self._remember(profile)
+        return profile
+
+    def calibrate(self, camera_id, frame, corners, edges, warped):
+        """Build, remember and persist a profile from a full pipeline run."""
+        profile = CalibrationProfile(camera_id, corners, frame.shape[1::-1], edges, get_prominent_color(warped))
+        profile.baseline = profile.felt_scores(warped)
+        self._remember(profile)
+        if self.directory:
+            self._save(profile)
+        return profile
+
+    def discard(self, camera_id):
+        with self._lock:
+            self._profiles.pop(camera_id, None)
+        if self.directory and os.path.exists(self._path(camera_id)):
+            os.remove(self._path(camera_id))
+
+    def _save(self, profile):
+        np.savez(
+            self._path(profile.camera_id),
+            corners=profile.corners,
+            frame_size=np.array(profile.frame_size),
+            edges=np.array(profile.edges),
+            felt_hsv=profile.felt_hsv,
+            baseline=np.array(profile.baseline),
+            map1=profile.map1,
+            map2=profile.map2,
+        )
+
+    def _load(self, camera_id):
+        data = np.load(self._path(camera_id))
+        profile = CalibrationProfile.__new__(CalibrationProfile)
+        profile.camera_id = camera_id
+        profile.corners = data["corners"]
+        profile.frame_size = tuple(int(v) for v in data["frame_size"])
+        profile.edges = [[tuple(int(v) for v in point) for point in edge] for edge in data["edges"]]
+        profile.felt_hsv = data["felt_hsv"]
+        profile.baseline = tuple(float(v) for v in data["baseline"])
+        profile.matrix, profile.output_size = perspective_for_corners(profile.corners)
+        profile.map1, profile.map2 = data["map1"], data["map2"]
+        return profile
@@ -1,55 +1,116 @@
 import cv2
 import numpy as np
 from PoolBall import PoolBall
+from TableState import TableState
+from Pyramid import usePyramid, downscale, scaleParam, refineCircles
+from ImageIO import frame_buffers
+from Metrics import timed
+
+CIRCLE_MIN_DIST = 60
+CIRCLE_MIN_RADIUS = 20
+CIRCLE_MAX_RADIUS = 30
+CIRCLE_ACCUMULATOR = 25  # HoughCircles param2 (votes needed for a circle centre)
+CIRCLE_CANDIDATE_ACCUMULATOR = 16  # Looser param2 for the coarse pyramid pass; every hit is re-checked at full size
 
 def preprocess(img):
   
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=frame_buffers.get(img.shape[:2]))
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0, dst=frame_buffers.get(img.shape[:2]))
     return blurred
 
-def plotCircles(img, circles):
-    pool_balls = []
-    avg_radius = 0  # Default
+HSV_HIST_BINS = 16
+_disc_offsets = {}
 
-    if circles is not None:
-        circles = np.round(circles[0, :]).astype("int")
-        radius_list = [circle[2] for circle in circles]
-        min_radius = min(radius_list)
-        avg_radius = int(sum(radius_list) / len(radius_list))
-        
-        for (x, y, r) in circles:
-            if r > min_radius * 2:  # Ignore large circles that are likely not balls
-                continue
-            
-            # Calculate the average color within the circle
-            mask = np.zeros(img.shape[:2], dtype="uint8")
-            cv2.circle(mask, (x, y), r, 255, -1)  # Mask the circle
-            mean_color = cv2.mean(img, mask=mask)  # Extract mean color from masked region
-            color = tuple(map(int, mean_color[:3]))  # Convert BGR to integer RGB
-
-            # Create a PoolBall with the detected properties
-            pool_ball = PoolBall(x, y, color=color, suit="solid")
-            pool_balls.append(pool_ball)
-            
-            print(f"Circle: x-cord: {x}, y-cord: {y}, radius: {r}, color: {color}")
-            
-            # Draw the circle and color on the image
-            cv2.circle(img, center=(x, y), radius=r, color=color, thickness=-1)  # Fill with the detected color
-
-        buildBorder(circles, min_radius)
-    
-    return img, pool_balls, avg_radius
+def discOffsets(radius):
+    """
+    Pixel offsets (dy, dx) of a filled disc of the given radius and their
+    squared distance from the centre, cached per radius.
+    """
+    if radius not in _disc_offsets:
+        dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+        dy, dx = dy.ravel(), dx.ravel()
+        _disc_offsets[radius] = (dy, dx, dy * dy + dx * dx)
+    return _disc_offsets[radius]
+
+@timed("colors")
+def sampleBallColors(img, circles, median=False, hsv_hist=False):
+    """
+    Sample the pixels under every circle in one batched pass.
+
+    Only the discs themselves are gathered (via precomputed offsets), so the cost
+    is O(balls x ball area) rather than one full-frame mask per ball.
+
+    Args:
+        img (numpy array): BGR image.
+        circles (numpy array): (N, 3) integer rows of (x, y, r).
+        median (bool): Also return the per-channel median colour.
+        hsv_hist (bool): Also return normalised H, S and V histograms.
+
+    Returns:
+        dict: "mean" (N, 3) float, plus "median" (N, 3) and "hsv_hist"
+        (N, 3, HSV_HIST_BINS) when requested.
+    """
+    circles = np.asarray(circles, dtype=np.int64).reshape(-1, 3)
+    height, width = img.shape[:2]
+    dy, dx, dist2 = discOffsets(int(circles[:, 2].max()) if len(circles) else 0)
+
+    ys = circles[:, 1:2] + dy
+    xs = circles[:, 0:1] + dx
+    inside = (dist2 <= circles[:, 2:3] ** 2) & (ys >= 0) & (ys < height) & (xs >= 0) & (xs < width)
+    pixels = img[np.clip(ys, 0, height - 1), np.clip(xs, 0, width - 1)]  # (N, K, 3)
+
+    counts = np.maximum(inside.sum(axis=1), 1)[:, None]
+    samples = {"mean": (pixels * inside[..., None]).sum(axis=1) / counts}
+
+    if median:
+        masked = np.where(inside[..., None], pixels.astype(np.float32), np.nan)
+        samples["median"] = np.nan_to_num(np.nanmedian(masked, axis=1))
+
+    if hsv_hist:
+        hsv = cv2.cvtColor(pixels.astype(np.uint8), cv2.COLOR_BGR2HSV)
+        ranges = np.array([180, 256, 256])
+        bins = (hsv.astype(np.int64) * HSV_HIST_BINS // ranges).clip(0, HSV_HIST_BINS - 1)
+        ball = np.arange(len(circles))[:, None, None]
+        channel = np.arange(3)[None, None, :]
+        flat = ((ball * 3 + channel) * HSV_HIST_BINS + bins).ravel()
+        weights = np.repeat(inside[..., None], 3, axis=2).ravel()
+        hist = np.bincount(flat, weights=weights, minlength=len(circles) * 3 * HSV_HIST_BINS)
+        samples["hsv_hist"] = hist.reshape(len(circles), 3, HSV_HIST_BINS) / counts[:, :, None]
+
+    return samples
+
+def plotCircles(img, circles, edges=None):
+    """
+    Turn detected circles into a TableState (every ball a solid for now) and
+    paint each ball's sampled colour onto img.
 
-def displayBalls(pool_balls, img, radius):
+    Returns:
+        tuple: (img, TableState)
+    """
+    if circles is None:
+        return img, TableState([], [], edges, 0)
+
+    circles = np.round(circles[0, :]).astype("int")
+    min_radius = circles[:, 2].min()
+    avg_radius = int(circles[:, 2].mean())
+
+    balls = circles[circles[:, 2] <= min_radius * 2]  # Ignore large circles that are likely not balls
+    colors = sampleBallColors(img, balls)["mean"].astype(np.uint8)  # Mean BGR per ball
+
+    for (x, y, r), color in zip(balls, colors):
+        # Draw the circle and color on the image
+        cv2.circle(img, center=(int(x), int(y)), radius=int(r), color=tuple(map(int, color)), thickness=-1)
+
+    buildBorder(circles, min_radius)
+    return img, TableState(balls[:, :2], colors, edges, avg_radius, radii=balls[:, 2])
+
+def displayBalls(table, img, radius):
     """
     Place the detected pool balls onto the pool table background.
     """
-    for pool_ball in pool_balls:
-        x, y = pool_ball.x_cord, pool_ball.y_cord
-        
+    for (x, y), color in zip(table.positions.astype(int), table.colors):
         # Draw the cartoon ball on the pool table image
-        cv2.circle(img, (x, y), radius, pool_ball.color, -1)
+        cv2.circle(img, (int(x), int(y)), radius, tuple(map(int, color)), -1)
     
     return img
 
@@ -103,14 +164,42 @@ def addPoolTable(img, pocket_positions, edges, pool_ball_size):
 
     return img
 
-def cartoonify(img, edges):
+@timed("circles")
+def detectCircles(img, pyramid=False):
+    """
+    Find ball candidates with HoughCircles. In pyramid mode the search runs on a
+    downscaled frame with scaled radius/distance limits and a looser vote
+    threshold, and each hit is then confirmed at full resolution in a small
+    window with the full-resolution threshold.
+
+    Returns:
+        numpy array | None: (1, N, 3) circles as returned by cv2.HoughCircles.
+    """
+    blurred = preprocess(img)
+    small, scale = downscale(blurred) if usePyramid(img, pyramid) else (blurred, 1.0)
+    if scale >= 1.0:
+        return cv2.HoughCircles(blurred, cv2.HOUGH_GRADIENT, dp=1, minDist=CIRCLE_MIN_DIST, param1=50,
+                                param2=CIRCLE_ACCUMULATOR, minRadius=CIRCLE_MIN_RADIUS, maxRadius=CIRCLE_MAX_RADIUS)
+
+    circles = cv2.HoughCircles(small, cv2.HOUGH_GRADIENT, dp=1, minDist=scaleParam(CIRCLE_MIN_DIST, scale),
+                               param1=50, param2=scaleParam(CIRCLE_CANDIDATE_ACCUMULATOR, scale, 8),
+                               minRadius=scaleParam(CIRCLE_MIN_RADIUS, scale),
+                               maxRadius=scaleParam(CIRCLE_MAX_RADIUS, scale, 2))
+    if circles is None:
+        return None
+    return refineCircles(blurred, circles, scale, CIRCLE_MIN_RADIUS, CIRCLE_MAX_RADIUS, CIRCLE_ACCUMULATOR)
+
+def cartoonify(img, edges, pyramid=False, tracker=None, render=True):
     '''
     input: numpy.ndarray
-    output: numpy.ndarray, [PoolBalls]
+    output: numpy.ndarray, TableState, pocket positions
+
+    With a BallTracker, balls keep their IDs between frames and full Hough
+    detection only runs on the tracker's keyframes. With render=False the
+    cartoon canvas is not drawn (None is returned in its place); use
+    Scene.build_scene to describe the table instead.
     '''
     
-    blurred = preprocess(img)
-    circles = cv2.HoughCircles(blurred, cv2.HOUGH_GRADIENT, dp=1, minDist=60, param1=50, param2=25, minRadius=20, maxRadius=30)
 
         
     top_edge = edges[0]
@@ -119,20 +208,26 @@ def cartoonify(img, edges):
     HEIGHT = left_edge[1][1] - left_edge[0][1]
     pocket_positions = createPocketsFromEdges(edges) 
     
-    img, pool_balls, avg_radius = plotCircles(img, circles)
+    if tracker is not None:
+        table, _ = tracker.update(img, pyramid=pyramid, edges=edges)
+    else:
+        img, table = plotCircles(img, detectCircles(img, pyramid=pyramid), edges)
+
+    if not render:
+        return None, table, pocket_positions
 
     blank_canvas = np.zeros((HEIGHT, WIDTH, 3), dtype="uint8")
-    cartoon_table = addPoolTable(blank_canvas, pocket_positions, edges, avg_radius)
-    cartoon_balls = displayBalls(pool_balls, cartoon_table, radius=avg_radius)
+    cartoon_table = addPoolTable(blank_canvas, pocket_positions, edges, table.radius)
+    cartoon_balls = displayBalls(table, cartoon_table, radius=table.radius)
     # showImgs(img, cartoon_img)  # Uncomment
     
-    return cartoon_balls, pool_balls, avg_radius, pocket_positions
+    return cartoon_balls, table, pocket_positions
     
 # Testing
 if __name__ == '__main__':
     table_coordinates = np.float32([[415, 239], [172, 1121],
                        [1575, 1158], [1380, 243]])
     
-    cartoon_img, pool_balls, avg_radius = cartoonify(table_coordinates)
+    cartoon_img, table, pocket_positions = cartoonify(table_coordinates)
     # If you need to save the image after cartoonification:
     # cv2.imwrite("cartoonified_pool_table.png", cartoon_img)
@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import cv2
+import numpy as np
+
+IMAGE_FORMATS = ("png", "jpeg", "webp", "raw")
+IMAGE_MIMETYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp", "raw": "application/octet-stream"}
+DEFAULT_QUALITY = 85
+MAX_POOLED_PER_SHAPE = 4  # Idle buffers kept per (shape, dtype) once a lease ends
+MAX_POOLED_BYTES = 64 * 1024 * 1024  # Idle bytes kept across all shapes; least recently used shapes go first
+
+
+def decode_image(data):
+    """
+    Decode JPEG/PNG/WebP bytes straight from the request buffer. The bytes are
+    wrapped with np.frombuffer (no copy) and handed to cv2.imdecode.
+
+    Raises:
+        ValueError: If the data is empty or not a supported image.
+    """
+    if not data:
+        raise ValueError("No image data")
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode image; send JPEG, PNG or WebP")
+    return img
+
+
+def encode_image(img, fmt="png", quality=DEFAULT_QUALITY):
+    """
+    Encode a BGR image for the response.
+
+    Args:
+        img (numpy array): BGR image.
+        fmt (str): One of IMAGE_FORMATS; "raw" is the BGR pixels row by row.
+        quality (int): JPEG/WebP quality (1-100).
+
+    Returns:
+        tuple: (bytes, mimetype)
+    """
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(IMAGE_FORMATS)}")
+    if fmt == "raw":
+        return np.ascontiguousarray(img).tobytes(), IMAGE_MIMETYPES[fmt]
+
+    params = []
+    if fmt == "jpeg":
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    elif fmt == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    ok, encoded = cv2.imencode("." + fmt, img, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {fmt}")
+    return encoded.tobytes(), IMAGE_MIMETYPES[fmt]
+
+
+class BufferPool:
+    """
+    Reusable frame and work buffers for the per-request pipeline stages.
+
+    Buffers are handed out inside a lease (one per request); get() returns a
+    pooled array of the requested shape that stays reserved until the lease
+    ends, when every buffer goes back to the pool. Outside a lease get() just
+    allocates, so pipeline functions can always ask for a buffer.
+
+    Warped frames take their size from the detected corners, so most uploads
+    ask for shapes no earlier request used. Idle buffers are therefore capped
+    in total bytes too, and the shapes used least recently are dropped first.
+    """
+
+    def __init__(self, max_per_shape=MAX_POOLED_PER_SHAPE, max_bytes=MAX_POOLED_BYTES):
+        self.max_per_shape = max_per_shape
+        self.max_bytes = max_bytes
+        self.allocations = 0
+        self.reuses = 0
+        self.evictions = 0
+        self.idle_bytes = 0
+        self._free = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def lease(self):
+        outer = getattr(self._local, "leased", None)
+        self._local.leased = []
+        try:
+            yield self
+        finally:
+            leased, self._local.leased = self._local.leased, outer
+            with self._lock:
+                for key, buffer in leased:
+                    free = self._free.setdefault(key, [])
+                    self._free.move_to_end(key)
+                    if len(free) < self.max_per_shape:
+                        free.append(buffer)
+                        self.idle_bytes += buffer.nbytes
+                self._evict()
+
+    def _evict(self):
+        """Drop idle buffers of the least recently used shapes until under max_bytes."""
+        while self._free and self.idle_bytes > self.max_bytes:
+            key, free = next(iter(self._free.items()))
+            if free:
+                self.idle_bytes -= free.pop().nbytes
+                self.evictions += 1
+            if not free:
+                del self._free[key]
+
+    def get(self, shape, dtype=np.uint8):
+        leased = getattr(self._local, "leased", None)
+        if leased is None:
+            return np.empty(shape, dtype=dtype)
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            free = self._free.get(key)
+            buffer = free.pop() if free else None
+            if buffer is None:
+                self.allocations += 1
+            else:
+                self.reuses += 1
+                self.idle_bytes -= buffer.nbytes
+                self._free.move_to_end(key)
+        if buffer is None:
+            buffer = np.empty(shape, dtype=dtype)
+        leased.append((key, buffer))
+        return buffer
+
+    def stats(self):
+        with self._lock:
+            return {
+                "allocations": self.allocations,
+                "reuses": self.reuses,
+                "evictions": self.evictions,
+                "idle_buffers": sum(len(free) for free in self._free.values()),
+                "idle_bytes": self.idle_bytes,
+            }
+
+
+frame_buffers = BufferPool()
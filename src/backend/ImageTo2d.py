@@ -1,5 +1,9 @@
+import logging
 import cv2
 import numpy as np
+from ImageIO import frame_buffers
+
+logger = logging.getLogger(__name__)
 
 def order_corners(corners):
     rect = np.zeros((4, 2), dtype="float32")
@@ -37,14 +41,40 @@ def get_prominent_color(image):
     
     return avg_hsv
 
-def getOutlineAndTransform(image, padding=50):    
+def felt_hsv_range(avg_hsv):
+    """HSV bounds around the felt colour used for the table mask."""
+    h, s, v = (int(c) for c in avg_hsv)
+    lower_hsv = np.array([max(0, h - 10), max(0, s - 50), max(0, v - 50)])
+    upper_hsv = np.array([min(179, h + 10), min(255, s + 50), min(255, v + 50)])
+    return lower_hsv, upper_hsv
+
+def perspective_for_corners(padded_corners):
+    """
+    Perspective matrix that maps the padded table corners onto an upright
+    rectangle, and that rectangle's (width, height).
+    """
+    output_width = int(np.linalg.norm(padded_corners[1] - padded_corners[0]))
+    output_height = int(np.linalg.norm(padded_corners[3] - padded_corners[0]))
+
+    dst_points = np.array([
+        [0, 0],
+        [output_width - 1, 0],
+        [output_width - 1, output_height - 1],
+        [0, output_height - 1]
+    ], dtype="float32")
+
+    M = cv2.getPerspectiveTransform(padded_corners, dst_points)
+    return M, (output_width, output_height)
+
+def getOutlineAndTransform(image, padding=50):
+    # The felt mask is a few cheap per-pixel passes, so the outline is always found at full
+    # resolution: corners from a downscaled mask were off by tens of pixels on rotated tables
     if image is None:
-        print("Error: Could not load image. Check the file path.")
+        logger.warning("Could not load image")
         return None, None
 
     avg_hsv = get_prominent_color(image)
-    lower_hsv = np.array([max(0, avg_hsv[0] - 10), max(0, avg_hsv[1] - 50), max(0, avg_hsv[2] - 50)])
-    upper_hsv = np.array([min(179, avg_hsv[0] + 10), min(255, avg_hsv[1] + 50), min(255, avg_hsv[2] + 50)])
+    lower_hsv, upper_hsv = felt_hsv_range(avg_hsv)
 
     hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
     mask = cv2.inRange(hsv, lower_hsv, upper_hsv)
@@ -57,7 +87,7 @@ def getOutlineAndTransform(image, padding=50):
 
     contours, _ = cv2.findContours(mask.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     if not contours:
-        print("No table detected. Try adjusting lighting or HSV thresholds.")
+        logger.warning("No table detected. Try adjusting lighting or HSV thresholds.")
         return None, None
 
  
@@ -68,7 +98,7 @@ def getOutlineAndTransform(image, padding=50):
     approx = cv2.approxPolyDP(table_contour, 0.02 * peri, True)
 
     if len(approx) < 4:
-        print("Could not approximate a 4-corner table. Found:", len(approx))
+        logger.warning("Could not approximate a 4-corner table. Found: %d", len(approx))
         return None, None
 
     # Order corners and add padding
@@ -79,19 +109,9 @@ def getOutlineAndTransform(image, padding=50):
     padded_corners = add_padding(ordered_corners, padding, width, height)
 
 
-    output_width = int(np.linalg.norm(padded_corners[1] - padded_corners[0]))
-    output_height = int(np.linalg.norm(padded_corners[3] - padded_corners[0]))
-
-    dst_points = np.array([
-        [0, 0],
-        [output_width - 1, 0],
-        [output_width - 1, output_height - 1],
-        [0, output_height - 1]
-    ], dtype="float32")
-
-  
-    M = cv2.getPerspectiveTransform(padded_corners, dst_points)
-    warped = cv2.warpPerspective(image, M, (output_width, output_height))
+    M, (output_width, output_height) = perspective_for_corners(padded_corners)
+    warped = cv2.warpPerspective(image, M, (output_width, output_height),
+                                 dst=frame_buffers.get((output_height, output_width) + image.shape[2:]))
 
     return warped, padded_corners
 
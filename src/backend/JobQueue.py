@@ -0,0 +1,295 @@
+import base64
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+from ImageIO import decode_image, encode_image, frame_buffers
+from Scene import describe_table
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING = 32  # Jobs allowed to wait for a worker before submissions are rejected
+RESULT_TTL = 300.0  # Seconds a finished job's result stays available for polling
+MAX_WAIT = 30.0  # Longest long-poll a client may ask for
+
+
+class QueueFullError(Exception):
+    """Raised by JobQueue.submit when the pending queue is at capacity."""
+
+
+class JobQueue:
+    """
+    Bounded job queue in front of a process pool.
+
+    Submitted jobs wait in a queue of at most max_pending entries; a dispatcher
+    thread hands them to the pool only when a worker is free, so the queue depth
+    reported by stats() is the real backlog and a burst beyond capacity is
+    rejected up front instead of piling up inside the executor.
+
+    on_done(job), if given, runs on every successful job before it is marked
+    done and may replace job["result"]; if it raises, the job fails instead.
+    """
+
+    def __init__(self, run_job, workers=None, max_pending=MAX_PENDING, result_ttl=RESULT_TTL,
+                 initializer=None, on_done=None):
+        self.run_job = run_job
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.initializer = initializer
+        self.on_done = on_done
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait_ms = 0.0
+        self.total_run_ms = 0.0
+
+        self._jobs = {}
+        self._events = {}
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._slots = threading.Semaphore(self.workers)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._dispatcher = None
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=self.initializer)
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name="job-dispatcher", daemon=True)
+                self._dispatcher.start()
+
+    def warm(self):
+        """Spawn and initialise every worker now instead of on the first job."""
+        self.start()
+        for future in [self._executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def submit(self, *args, meta=None):
+        """
+        Queue run_job(*args) and return the new job's ID.
+
+        Raises:
+            QueueFullError: If max_pending jobs are already waiting.
+        """
+        self.start()
+        self._prune()
+        job_id = uuid.uuid4().hex
+        job = {"id": job_id, "status": "queued", "submitted": time.time(), "started": None,
+               "finished": None, "result": None, "error": None, "meta": meta or {}}
+        with self._lock:
+            self._jobs[job_id] = job
+            self._events[job_id] = threading.Event()
+        try:
+            self._pending.put_nowait((job_id, args))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+                del self._events[job_id]
+                self.rejected += 1
+            raise QueueFullError(f"Job queue is full ({self.max_pending} pending)")
+        with self._lock:
+            self.submitted += 1
+        return job_id
+
+    def _dispatch(self):
+        while True:
+            self._slots.acquire()
+            job_id, args = self._pending.get()
+            with self._lock:
+                executor = self._executor
+                if job_id is None:  # Wake-up from close()
+                    self._slots.release()
+                    if executor is None:
+                        self._dispatcher = None
+                        return
+                    continue
+                job = self._jobs[job_id]
+                job["status"] = "running"
+                job["started"] = time.time()
+            try:
+                if executor is None:
+                    raise RuntimeError("Job queue is closed")
+                future = executor.submit(self.run_job, *args)
+            except Exception as e:
+                # A closed or broken pool fails this job; the dispatcher itself must keep going
+                if isinstance(e, BrokenProcessPool):
+                    self._replace_executor(executor)
+                self._fail(job_id, e)
+                continue
+            future.add_done_callback(lambda f, job_id=job_id, executor=executor: self._finish(job_id, f, executor))
+
+    def _replace_executor(self, broken):
+        """Swap a pool whose worker died for a fresh one, unless the queue was closed meanwhile."""
+        logger.warning("Job worker pool broke; starting a new one")
+        with self._lock:
+            if self._executor is broken:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=self.initializer)
+        # No shutdown(): a broken pool has already torn down its workers and wake-up pipe
+
+    def _fail(self, job_id, error, release_slot=True):
+        """Mark a job that never reached a worker as failed, giving back the slot it took."""
+        if release_slot:
+            self._slots.release()
+        with self._lock:
+            job = self._jobs[job_id]
+            job["finished"] = time.time()
+            job["started"] = job["started"] or job["finished"]
+            job["error"] = str(error)
+            job["status"] = "failed"
+            self.failed += 1
+            self.total_wait_ms += (job["started"] - job["submitted"]) * 1000.0
+        self._events[job_id].set()
+
+    def _finish(self, job_id, future, executor):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._replace_executor(executor)  # A worker died mid-job; later jobs get a fresh pool
+        self._slots.release()
+        result, error = None, None
+        try:
+            result = future.result()
+        except Exception as e:
+            error = e
+        if error is None and self.on_done is not None:
+            # on_done gets a private copy, so a poll never sees the result before it has run
+            with self._lock:
+                done = dict(self._jobs[job_id], result=result)
+            try:
+                self.on_done(done)
+                result = done["result"]
+            except Exception as e:
+                error = e
+        with self._lock:
+            job = self._jobs[job_id]
+            job["finished"] = time.time()
+            if error is None:
+                job["result"] = result
+                job["status"] = "done"
+                self.completed += 1
+            else:
+                job["error"] = str(error)
+                job["status"] = "failed"
+                self.failed += 1
+            self.total_wait_ms += (job["started"] - job["submitted"]) * 1000.0
+            self.total_run_ms += (job["finished"] - job["started"]) * 1000.0
+        self._events[job_id].set()
+
+    def get(self, job_id, wait=0.0):
+        """
+        The job record, optionally long-polling up to wait seconds for it to finish.
+
+        Returns:
+            dict | None: None if the job is unknown or has expired.
+        """
+        event = self._events.get(job_id)
+        if event is None:
+            return None
+        if wait > 0:
+            event.wait(min(wait, MAX_WAIT))
+        return self.describe(self._jobs.get(job_id))
+
+    @staticmethod
+    def describe(job):
+        if job is None:
+            return None
+        timing = {}
+        if job["started"] is not None:
+            timing["queued_ms"] = round((job["started"] - job["submitted"]) * 1000.0, 2)
+        if job["finished"] is not None:
+            timing["run_ms"] = round((job["finished"] - job["started"]) * 1000.0, 2)
+        return {"job_id": job["id"], "status": job["status"], "result": job["result"],
+                "error": job["error"], "timing": timing, **job["meta"]}
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            for job_id in [j for j, job in self._jobs.items() if job["finished"] and job["finished"] < cutoff]:
+                del self._jobs[job_id]
+                del self._events[job_id]
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job["status"] == "running")
+            finished = self.completed + self.failed
+            return {
+                "workers": self.workers,
+                "queue_depth": self._pending.qsize(),
+                "max_pending": self.max_pending,
+                "running": running,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_queued_ms": self.total_wait_ms / finished if finished else None,
+                "avg_run_ms": self.total_run_ms / finished if finished else None,
+            }
+
+    def close(self):
+        """
+        Shut the pool down. Jobs still queued fail, and the dispatcher exits
+        once it sees the queue closed; a later submit() starts both again.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        while True:
+            try:
+                job_id, _ = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if job_id is not None:
+                self._fail(job_id, "Job queue is closed", release_slot=False)
+        try:
+            self._pending.put_nowait((None, None))
+        except queue.Full:
+            pass  # submit() reopened the queue meanwhile, so the dispatcher keeps serving it
+
+
+_worker_calibration = None
+
+
+def warm_cv_worker():
+    """
+    Load OpenCV and run the detection primitives once per worker process, so the
+    first real job doesn't pay for imports, thread pools and lazy allocations.
+    """
+    global _worker_calibration
+    from Calibration import CalibrationStore
+    from Warmup import warm_cv
+
+    _worker_calibration = CalibrationStore(os.environ.get('CUETIPS_CALIBRATION_DIR', 'calibration'))
+    cv2.setNumThreads(1)  # Parallelism comes from the pool, not from OpenCV inside each worker
+    try:
+        warm_cv()
+    except Exception:
+        logger.exception("Job worker CV warm-up failed")  # Only costs the first job its cold start
+
+
+def upload_job(image_bytes, pyramid="auto", camera_id=None, output="scene"):
+    """
+    The /upload pipeline as a pool job: decode, warp, find rails and balls and
+    describe the table (output "scene" or "svg") or draw it as a PNG ("raster").
+
+    Returns:
+        dict: the output under its own key ("scene", "svg" or "image" as
+        base64 PNG) and "table" (the TableState).
+    """
+    from main import getCueTips
+
+    with frame_buffers.lease():
+        img = decode_image(image_bytes)
+        table_graphic, _, _, table = getCueTips(img, run_sim=False, pyramid=pyramid, camera_id=camera_id,
+                                                calibration=_worker_calibration, render=output == "raster")
+    if output != "raster":
+        return {output: describe_table(table, output), "table": table}
+    png, _ = encode_image(table_graphic, "png")
+    return {"image": base64.b64encode(png).decode("utf-8"), "table": table}
@@ -0,0 +1,179 @@
+import json
+import struct
+import threading
+import time
+import cv2
+import numpy as np
+
+FRAME_HEADER = struct.Struct(">I")  # Big-endian length prefix before every JPEG
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+IDLE_TIMEOUT = 60.0  # Seconds without frames or listeners before a stream is closed
+
+
+class LatestFrameSlot:
+    """
+    A one-frame mailbox. put() always overwrites, so when the pipeline is
+    behind the stale frame is dropped (and counted) rather than queued.
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._cond = threading.Condition()
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self.received += 1
+            self._cond.notify()
+
+    def take(self, timeout=None):
+        with self._cond:
+            if self._frame is None:
+                self._cond.wait(timeout)
+            frame, self._frame = self._frame, None
+            return frame
+
+
+def read_frames(stream, max_frame_bytes=MAX_FRAME_BYTES):
+    """
+    Yield frames from a length-prefixed byte stream: a 4-byte big-endian
+    length followed by that many bytes of JPEG, repeated until EOF.
+    """
+    while True:
+        header = stream.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return
+        (length,) = FRAME_HEADER.unpack(header)
+        if length > max_frame_bytes:
+            raise ValueError(f"Frame of {length} bytes exceeds the {max_frame_bytes} byte limit")
+        data = b""
+        while len(data) < length:
+            chunk = stream.read(length - len(data))
+            if not chunk:
+                return
+            data += chunk
+        yield data
+
+
+class LiveSession:
+    """
+    One camera stream: frames land in a LatestFrameSlot, a worker thread
+    processes only the newest one, and listeners are handed the newest result.
+    """
+
+    def __init__(self, stream_id, process_frame):
+        self.stream_id = stream_id
+        self.process_frame = process_frame
+        self.slot = LatestFrameSlot()
+        self.options = {}
+        self.state = {}  # Per-stream state kept across frames (e.g. a ball tracker)
+        self.processed = 0
+        self.failed = 0
+        self.last_latency_ms = None
+        self.total_latency_ms = 0.0
+        self.last_activity = time.monotonic()
+
+        self._result = None
+        self._seq = 0
+        self._result_cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"live-{stream_id}", daemon=True)
+        self._thread.start()
+
+    def push(self, jpeg_bytes):
+        self.last_activity = time.monotonic()
+        self.slot.put((time.perf_counter(), jpeg_bytes))
+
+    def _run(self):
+        while self._running:
+            item = self.slot.take(timeout=1.0)
+            if item is None:
+                continue
+            received_at, jpeg_bytes = item
+            frame = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+            try:
+                if frame is None:
+                    raise ValueError("Could not decode frame")
+                result = self.process_frame(frame, dict(self.options), self.state)
+            except Exception as e:
+                self.failed += 1
+                result = {"error": str(e)}
+
+            latency_ms = (time.perf_counter() - received_at) * 1000.0
+            self.processed += 1
+            self.last_latency_ms = latency_ms
+            self.total_latency_ms += latency_ms
+            result.update({"latency_ms": round(latency_ms, 2), "dropped": self.slot.dropped})
+            with self._result_cond:
+                self._seq += 1
+                result["seq"] = self._seq
+                self._result = result
+                self._result_cond.notify_all()
+
+    def wait_result(self, after_seq, timeout):
+        """Newest result with seq > after_seq, or None if none arrives in time."""
+        with self._result_cond:
+            if self._seq <= after_seq:
+                self._result_cond.wait(timeout)
+            if self._seq <= after_seq:
+                return None
+            return self._result
+
+    def stats(self):
+        return {
+            "stream_id": self.stream_id,
+            "received": self.slot.received,
+            "processed": self.processed,
+            "dropped": self.slot.dropped,
+            "failed": self.failed,
+            "last_latency_ms": self.last_latency_ms,
+            "avg_latency_ms": self.total_latency_ms / self.processed if self.processed else None,
+        }
+
+    def close(self):
+        self._running = False
+
+
+class LiveStreamManager:
+    """Live sessions by stream ID, created on first use and closed when idle."""
+
+    def __init__(self, process_frame, idle_timeout=IDLE_TIMEOUT):
+        self.process_frame = process_frame
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, stream_id, create=True):
+        with self._lock:
+            self._close_idle()
+            session = self._sessions.get(stream_id)
+            if session is None and create:
+                session = LiveSession(stream_id, self.process_frame)
+                self._sessions[stream_id] = session
+            if session is not None:
+                session.last_activity = time.monotonic()
+            return session
+
+    def _close_idle(self):
+        now = time.monotonic()
+        for stream_id, session in list(self._sessions.items()):
+            if now - session.last_activity > self.idle_timeout:
+                session.close()
+                del self._sessions[stream_id]
+
+
+def sse_events(session, heartbeat=15.0):
+    """Server-sent events carrying each new result as JSON; stale results are skipped."""
+    seq = 0
+    while True:
+        result = session.wait_result(seq, timeout=heartbeat)
+        session.last_activity = time.monotonic()
+        if result is None:
+            yield ": keep-alive\n\n"
+            continue
+        seq = result["seq"]
+        yield f"id: {seq}\ndata: {json.dumps(result)}\n\n"
@@ -1,8 +1,9 @@
 
 class PoolBall:
-    def __init__(self, x_cord, y_cord, color, suit):
+    def __init__(self, x_cord, y_cord, color, suit, ball_id=None):
         self.x_cord = x_cord
         self.y_cord = y_cord
         self.color = color
         self.suit = suit
+        self.ball_id = ball_id  # Stable identity across frames when tracked
         
\ No newline at end of file
@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+
+PYRAMID_MAX_DIM = 1024  # Longest side of the coarse frame used for detection
+
+
+def usePyramid(image, pyramid):
+    """
+    Resolve a pyramid setting: True/False are taken as-is, "auto" turns the
+    pyramid on only when the frame is larger than PYRAMID_MAX_DIM.
+    """
+    if pyramid == "auto":
+        return max(image.shape[:2]) > PYRAMID_MAX_DIM
+    return bool(pyramid)
+
+
+def downscale(image, max_dim=PYRAMID_MAX_DIM):
+    """
+    Shrink an image so its longest side is at most max_dim.
+
+    Returns:
+        tuple: (coarse image, scale) where coarse = full * scale and scale <= 1.
+    """
+    height, width = image.shape[:2]
+    scale = min(1.0, max_dim / float(max(height, width)))
+    if scale >= 1.0:
+        return image, 1.0
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def scaleParam(value, scale, minimum=1):
+    """Scale a pixel-sized detector parameter, never going below minimum."""
+    return max(minimum, int(round(value * scale)))
+
+
+def _window(center, half, width, height):
+    x, y = int(round(center[0])), int(round(center[1]))
+    x0, y0 = max(0, x - half), max(0, y - half)
+    x1, y1 = min(width, x + half + 1), min(height, y + half + 1)
+    return x0, y0, x1, y1
+
+
+def refineCircles(gray, circles, scale, min_radius, max_radius, accumulator):
+    """
+    Confirm coarse HoughCircles hits at full resolution, each in a window
+    around its scaled-up centre, with the full-resolution accumulator
+    threshold. The window spans two radii either side so the whole ball edge is
+    in view; of the circles found there the one nearest the coarse centre is
+    kept, and a hit with none within half a minimum radius is dropped.
+
+    Returns:
+        numpy array | None: (1, N, 3) float32, the same layout cv2.HoughCircles
+        returns, or None when no hit is confirmed.
+    """
+    height, width = gray.shape[:2]
+    refined = []
+    for x, y, r in circles[0]:
+        cx, cy = x / scale, y / scale
+        x0, y0, x1, y1 = _window((cx, cy), 2 * max_radius, width, height)
+        roi = gray[y0:y1, x0:x1]
+        if roi.shape[0] <= 2 * min_radius or roi.shape[1] <= 2 * min_radius:
+            continue
+        found = cv2.HoughCircles(roi, cv2.HOUGH_GRADIENT, dp=1, minDist=min_radius,
+                                 param1=50, param2=accumulator, minRadius=min_radius, maxRadius=max_radius)
+        if found is None:
+            continue
+        found = found[0] + np.array([x0, y0, 0], dtype=np.float32)
+        distances = np.hypot(found[:, 0] - cx, found[:, 1] - cy)
+        nearest = int(np.argmin(distances))
+        if distances[nearest] <= 0.5 * min_radius:
+            refined.append(found[nearest])
+    if not refined:
+        return None
+    return np.array([refined], dtype=np.float32)
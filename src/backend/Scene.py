@@ -0,0 +1,76 @@
+from Cartoonify import createPocketsFromEdges
+from TableState import NO_ID
+
+SCENE_OUTPUTS = ("scene", "svg", "raster")
+TABLE_COLOR = (0, 128, 0)  # BGR, same green as addPoolTable
+POCKET_COLOR = (0, 0, 0)
+POCKET_SCALE = 2.5  # Pocket radius as a multiple of the ball radius, as in addPoolTable
+
+
+def bgr_to_hex(color):
+    b, g, r = (int(c) for c in color[:3])
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def build_scene(table, pocket_positions):
+    """
+    Describe the cartoon table as data instead of pixels: the same canvas,
+    felt rectangle, pockets and balls that addPoolTable and displayBalls draw.
+
+    Args:
+        table (TableState): Detected balls and rails.
+        pocket_positions (List[tuple]): From createPocketsFromEdges.
+
+    Returns:
+        dict: "width", "height", "table", "pockets" and "balls", with colours
+        as "#rrggbb" strings.
+    """
+    edges = table.edges
+    (left, top), (right, bottom) = edges[0][0], edges[3][1]
+    width, height = table.table_size
+    avg_radius = table.radius
+    pocket_radius = int(avg_radius * POCKET_SCALE)
+
+    balls = []
+    for (x, y), color, ball_id in zip(table.positions.astype(int).tolist(), table.colors, table.ids.tolist()):
+        entry = {"x": x, "y": y, "color": bgr_to_hex(color)}
+        if ball_id != NO_ID:
+            entry["id"] = ball_id
+        balls.append(entry)
+
+    return {
+        "width": int(width),
+        "height": int(height),
+        "table": {"x": int(left), "y": int(top), "width": int(right - left), "height": int(bottom - top),
+                  "color": bgr_to_hex(TABLE_COLOR)},
+        "pockets": [{"x": int(x), "y": int(y)} for x, y in pocket_positions],
+        "pocket_radius": pocket_radius,
+        "pocket_color": bgr_to_hex(POCKET_COLOR),
+        "ball_radius": avg_radius,
+        "balls": balls,
+    }
+
+
+def scene_to_svg(scene):
+    """Render a build_scene description as a standalone SVG document."""
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{scene["width"]}" height="{scene["height"]}" '
+        f'viewBox="0 0 {scene["width"]} {scene["height"]}">',
+        f'<rect width="{scene["width"]}" height="{scene["height"]}" fill="#000000"/>',
+    ]
+    table = scene["table"]
+    parts.append(f'<rect x="{table["x"]}" y="{table["y"]}" width="{table["width"]}" height="{table["height"]}" '
+                 f'fill="{table["color"]}"/>')
+    for pocket in scene["pockets"]:
+        parts.append(f'<circle cx="{pocket["x"]}" cy="{pocket["y"]}" r="{scene["pocket_radius"]}" '
+                     f'fill="{scene["pocket_color"]}"/>')
+    for ball in scene["balls"]:
+        parts.append(f'<circle cx="{ball["x"]}" cy="{ball["y"]}" r="{scene["ball_radius"]}" fill="{ball["color"]}"/>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def describe_table(table, output="scene"):
+    """The parsed TableState as a scene dict, or as SVG when output is "svg"."""
+    scene = build_scene(table, createPocketsFromEdges(table.edges))
+    return scene_to_svg(scene) if output == "svg" else scene
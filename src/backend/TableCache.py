@@ -0,0 +1,156 @@
+import os
+import time
+import uuid
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL_SECONDS = 60 * 60
+
+
+class MemoryBackend:
+    """
+    In-process LRU store with a time-to-live per entry.
+
+    Only visible to the process that owns it, so use SQLiteBackend when more
+    than one worker process serves requests.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    Pickled entries in a local SQLite file shared by every worker process.
+
+    Rows carry their creation and last-access times; expired rows are ignored
+    and the least recently used rows are trimmed once max_entries is exceeded.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tables ("
+                "key TEXT PRIMARY KEY, data BLOB NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT data, created FROM tables WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            data, created = row
+            if created + self.ttl < now:
+                conn.execute("DELETE FROM tables WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE tables SET accessed = ? WHERE key = ?", (now, key))
+        return pickle.loads(data)
+
+    def set(self, key, value):
+        now = time.time()
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tables (key, data, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, data, now, now),
+            )
+            conn.execute("DELETE FROM tables WHERE created < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM tables WHERE key NOT IN "
+                "(SELECT key FROM tables ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM tables WHERE key = ?", (key,))
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM tables").fetchone()[0]
+
+
+class TableStateCache:
+    """
+    Session-keyed cache of parsed TableStates.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def new_session_id():
+        return uuid.uuid4().hex
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+        table_state = self.backend.get(session_id)
+        if table_state is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return table_state
+
+    def put(self, session_id, table_state):
+        self.backend.set(session_id, table_state)
+
+    def discard(self, session_id):
+        self.backend.delete(session_id)
+
+
+def cache_from_env():
+    """
+    Build the cache described by CUETIPS_TABLE_CACHE: "memory" (default) or
+    "sqlite:<path>". CUETIPS_TABLE_CACHE_SIZE and CUETIPS_TABLE_CACHE_TTL bound it.
+    """
+    spec = os.environ.get("CUETIPS_TABLE_CACHE", "memory")
+    max_entries = int(os.environ.get("CUETIPS_TABLE_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+    ttl = float(os.environ.get("CUETIPS_TABLE_CACHE_TTL", DEFAULT_TTL_SECONDS))
+
+    if spec == "memory":
+        return TableStateCache(MemoryBackend(max_entries, ttl))
+    if spec.startswith("sqlite:"):
+        return TableStateCache(SQLiteBackend(spec[len("sqlite:"):], max_entries, ttl))
+    raise ValueError(f"Unknown table cache backend: {spec}")
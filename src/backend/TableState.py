@@ -0,0 +1,117 @@
+import hashlib
+
+import numpy as np
+
+from PoolBall import PoolBall
+
+SUITS = ("solid", "stripe", "cue", "none")
+CUE_COLOR = (255, 255, 255)
+MAX_CUE_COLOR_DIFF = 100
+NO_ID = -1  # ids entry of a ball that is not tracked across frames
+
+
+class TableState:
+    """
+    A parsed table as a structure of arrays: one row per ball in positions
+    (N, 2), colors (N, 3), radii (N,), suits (N,) codes into SUITS and ids
+    (N,), plus the four rail edges and the average ball radius.
+
+    Instances are treated as immutable. They hash and compare by content and
+    pickle as a handful of raw column buffers, so a table crosses process
+    boundaries without per-ball objects.
+    """
+
+    def __init__(self, positions, colors, edges=None, radius=0, radii=None, suits=None, ids=None):
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        count = len(self.positions)
+        self.colors = np.asarray(colors, dtype=np.uint8).reshape(count, 3)
+        self.radius = int(radius)
+        self.radii = (np.full(count, self.radius, dtype=np.float32) if radii is None
+                      else np.asarray(radii, dtype=np.float32).reshape(count))
+        self.suits = (np.zeros(count, dtype=np.uint8) if suits is None
+                      else np.asarray(suits, dtype=np.uint8).reshape(count))
+        self.ids = (np.full(count, NO_ID, dtype=np.int64) if ids is None
+                    else np.asarray(ids, dtype=np.int64).reshape(count))
+        self.edges = None if edges is None else tuple(
+            tuple(tuple(int(v) for v in point) for point in edge) for edge in edges)
+        self._key = None
+        self._pockets = None
+
+    @classmethod
+    def from_balls(cls, pool_balls, edges=None, radius=0):
+        """Build a table state from PoolBall objects."""
+        return cls(
+            [(ball.x_cord, ball.y_cord) for ball in pool_balls],
+            [tuple(ball.color[:3]) for ball in pool_balls],
+            edges, radius,
+            suits=[SUITS.index(ball.suit) if ball.suit in SUITS else SUITS.index("none") for ball in pool_balls],
+            ids=[NO_ID if getattr(ball, "ball_id", None) is None else ball.ball_id for ball in pool_balls],
+        )
+
+    def with_edges(self, edges):
+        """The same balls on a table with the given rail edges."""
+        return TableState(self.positions, self.colors, edges, self.radius, self.radii, self.suits, self.ids)
+
+    def balls(self):
+        """The balls as PoolBall objects, for code that still draws one ball at a time."""
+        return [PoolBall(int(x), int(y), color=tuple(int(c) for c in color), suit=SUITS[suit],
+                         ball_id=None if ball_id == NO_ID else int(ball_id))
+                for (x, y), color, suit, ball_id in zip(self.positions, self.colors, self.suits, self.ids)]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def cue_index(self, max_color_diff=MAX_CUE_COLOR_DIFF):
+        """Index of the ball closest to white, or None if no ball is within max_color_diff."""
+        if not len(self):
+            return None
+        distance = np.linalg.norm(self.colors.astype(np.float64) - CUE_COLOR, axis=1)
+        index = int(np.argmin(distance))
+        return index if distance[index] <= max_color_diff else None
+
+    @property
+    def table_size(self):
+        """Width and height spanned by the top and left rails, as get_table_size."""
+        top_edge, left_edge = self.edges[0], self.edges[2]
+        return top_edge[1][0] - top_edge[0][0], left_edge[1][1] - left_edge[0][1]
+
+    @property
+    def pockets(self):
+        """(6, 2) pocket centres the simulations use, from get_pocket_positions."""
+        if self._pockets is None:
+            from physics.simulatePaths import get_pocket_positions
+
+            self._pockets = np.array(get_pocket_positions(*self.table_size), dtype=np.float64)
+        return self._pockets
+
+    def __reduce__(self):
+        # Each column as raw bytes in its own dtype, far smaller than pickling the arrays
+        return _from_columns, (self.positions.tobytes(), self.colors.tobytes(), self.edges, self.radius,
+                               self.radii.tobytes(), self.suits.tobytes(), self.ids.tobytes(), self.ids.dtype.str)
+
+    @property
+    def key(self):
+        """
+        Hex digest of everything the simulations depend on. Tracker ids are
+        left out, so the same layout keeps its cached shots and spaces when
+        balls are re-identified.
+        """
+        if self._key is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(repr((len(self), self.radius, self.edges)).encode())
+            for column in (self.positions, self.colors, self.radii):
+                digest.update(column.tobytes())
+            self._key = digest.hexdigest()
+        return self._key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, TableState) and self.key == other.key and np.array_equal(self.ids, other.ids)
+
+
+def _from_columns(positions, colors, edges, radius, radii, suits, ids, ids_dtype):
+    return TableState(np.frombuffer(positions, dtype=np.float64), np.frombuffer(colors, dtype=np.uint8), edges,
+                      radius, np.frombuffer(radii, dtype=np.float32), np.frombuffer(suits, dtype=np.uint8),
+                      np.frombuffer(ids, dtype=ids_dtype))
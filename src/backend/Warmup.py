@@ -0,0 +1,75 @@
+import logging
+import time
+import cv2
+import numpy as np
+from TableState import TableState
+
+logger = logging.getLogger(__name__)
+
+WARM_SIZE = (900, 600)  # Width and height of the synthetic table frame
+
+
+def synthetic_table(size=WARM_SIZE):
+    """
+    A small overhead frame of a green table with a few balls and a white cue
+    ball, enough to drive every stage of the CV pipeline once.
+    """
+    width, height = size
+    img = np.full((height, width, 3), (30, 60, 90), dtype=np.uint8)  # Brown surround
+    cv2.rectangle(img, (60, 60), (width - 60, height - 60), (10, 10, 10), -1)  # Dark rails
+    cv2.rectangle(img, (90, 90), (width - 90, height - 90), (40, 140, 30), -1)  # Felt
+    for (x, y), color in [((300, 250), (0, 0, 200)), ((450, 320), (0, 200, 200)), ((600, 260), (200, 0, 0))]:
+        cv2.circle(img, (x, y), 24, color, -1)
+    cv2.circle(img, (250, 380), 24, (255, 255, 255), -1)
+    return img
+
+
+def warm_cv():
+    """Run the full upload pipeline once on the synthetic frame."""
+    from main import getCueTips
+    from ImageIO import encode_image
+
+    with_table, _, _, table = getCueTips(synthetic_table(), run_sim=False)
+    encode_image(with_table, "png")
+    return table
+
+
+def warm_physics(table=None):
+    """
+    Build a pymunk table and run one shot through each engine, so pymunk's
+    native library, the event solver and the batch simulator are loaded.
+    """
+    from physics.simulatePaths import main
+    from physics.batchSimulate import simulate_batch
+
+    if table is None or table.edges is None or table.cue_index() is None:
+        edges = [[(0, 0), (400, 0)], [(0, 200), (400, 200)], [(0, 0), (0, 200)], [(400, 0), (400, 200)]]
+        table = TableState([(200, 100), (100, 100)], [(0, 0, 200), (255, 255, 255)], edges, 10)
+    for engine in ("step", "event"):
+        main(table, cue_angle=0, show_simulation=False, engine=engine, speed=150, seed=0)
+    simulate_batch(table, [(0.0, 150.0)])
+
+
+def warm_up():
+    """
+    Initialise OpenCV and the physics engines once before serving.
+
+    Returns:
+        dict: Seconds spent warming each part.
+    """
+    timings = {}
+    start = time.perf_counter()
+    table = None
+    try:
+        table = warm_cv()
+    except Exception:
+        logger.exception("CV warm-up failed")
+    timings["cv"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        warm_physics(table)
+    except Exception:
+        logger.exception("Physics warm-up failed")
+    timings["physics"] = time.perf_counter() - start
+    return timings
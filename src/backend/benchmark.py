@@ -0,0 +1,241 @@
+"""
+End-to-end benchmark of the CV pipeline and the physics over the data/ images.
+
+Every image (plus synthetic enlarged copies) goes through getOutlineAndTransform,
+getBorder, cartoonify and simulatePaths.main, and each table found is also
+swept with the batch simulator. Per-stage wall time (median of --repeat runs),
+peak traced memory and throughput are printed and can be saved as a JSON
+baseline; a later run given --baseline exits with status 1 if any stage got
+slower than its threshold allows, or no longer runs at all.
+
+    python benchmark.py --save baseline.json
+    python benchmark.py --baseline baseline.json --threshold 0.25
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from ImageTo2d import getOutlineAndTransform
+from Border import getBorder
+from Cartoonify import cartoonify
+from physics.simulatePaths import main as simulate
+from physics.batchSimulate import simulate_batch
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data")
+STAGES = ("outline", "border", "cartoonify", "simulate", "sweep")
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.25  # Allowed relative slowdown per stage
+NOISE_FLOOR_MS = 2.0  # Slowdowns smaller than this are never reported
+SWEEP_ANGLES = 72
+
+
+def measure(run, prepare=None, repeat=DEFAULT_REPEAT):
+    """
+    Time run(prepare()) repeat times, then once more under tracemalloc.
+
+    Returns:
+        tuple: (stats dict with median/min ms and peak KiB, last result)
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        arg = prepare() if prepare else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = run(arg)
+            times.append((time.perf_counter() - start) * 1000.0)
+
+    arg = prepare() if prepare else None
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "ms": round(statistics.median(times), 3),
+        "min_ms": round(min(times), 3),
+        "peak_kib": round(peak / 1024.0, 1),
+    }, result
+
+
+def load_cases(paths, upscale):
+    """
+    (name, image) for every image and an enlarged copy of it per upscale factor.
+
+    A copy centres the image on a black canvas factor times its size rather
+    than resizing it: the frame grows like a high-resolution camera's, but the
+    table, rails and balls keep the pixel sizes the detectors are tuned for, so
+    every stage still runs on it.
+    """
+    cases = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"skipping unreadable image {path}", file=sys.stderr)
+            continue
+        name = os.path.basename(path)
+        cases.append((name, image))
+        for factor in upscale:
+            height, width = image.shape[:2]
+            pad_y, pad_x = max(0, int(height * (factor - 1))), max(0, int(width * (factor - 1)))
+            big = cv2.copyMakeBorder(image, pad_y // 2, pad_y - pad_y // 2, pad_x // 2, pad_x - pad_x // 2,
+                                     cv2.BORDER_CONSTANT, value=(0, 0, 0))
+            cases.append((f"{name}@{factor:g}x", big))
+    return cases
+
+
+def bench_case(image, repeat, pyramid, sweep_angles):
+    """
+    Run every stage on one image; stages after a failure are skipped.
+
+    Returns:
+        dict: stage name -> stats (or {"error": message}).
+    """
+    stages = {}
+    try:
+        stages["outline"], (warped, _) = measure(lambda _: getOutlineAndTransform(image, padding=40),
+                                                 repeat=repeat)
+        if warped is None:
+            raise ValueError("no table outline found")
+
+        stages["border"], (_, edges) = measure(lambda img: getBorder(img), warped.copy, repeat)
+        if edges is None:
+            raise ValueError("no rails found")
+
+        stages["cartoonify"], (_, table, _) = measure(
+            lambda img: cartoonify(img, edges, pyramid=pyramid), warped.copy, repeat)
+        if not len(table):
+            raise ValueError("no balls found")
+
+        stages["simulate"], _ = measure(
+            lambda _: simulate(table, cue_angle=45, show_simulation=False, speed=200, seed=0), repeat=repeat)
+
+        shots = [(360.0 * i / sweep_angles, 200.0) for i in range(sweep_angles)]
+        stages["sweep"], _ = measure(lambda _: simulate_batch(table, shots), repeat=repeat)
+        stages["sweep"]["shots_per_s"] = round(sweep_angles / (stages["sweep"]["ms"] / 1000.0), 1)
+    except Exception as e:
+        stages["error"] = str(e)
+
+    pipeline = [stages[s]["ms"] for s in ("outline", "border", "cartoonify") if s in stages]
+    if len(pipeline) == 3:
+        stages["images_per_s"] = round(1000.0 / sum(pipeline), 2)
+    return stages
+
+
+def compare(results, baseline, threshold, stage_thresholds):
+    """
+    Stages slower than baseline * (1 + threshold) by more than NOISE_FLOOR_MS,
+    and stages the baseline timed that did not run this time.
+
+    Returns:
+        List[str]: One line per regression.
+    """
+    regressions = []
+    for case, then_stages in baseline.get("results", {}).items():
+        stages = results.get(case, {})
+        for stage in STAGES:
+            now = stages.get(stage)
+            then = then_stages.get(stage)
+            if not then:
+                continue
+            if not now:
+                reason = stages.get("error", "case not run") if stages else "case not run"
+                regressions.append(f"{case} {stage}: not run ({reason}), baseline {then['ms']:.1f} ms")
+                continue
+            limit = then["ms"] * (1.0 + stage_thresholds.get(stage, threshold))
+            if now["ms"] > limit and now["ms"] - then["ms"] > NOISE_FLOOR_MS:
+                regressions.append(f"{case} {stage}: {now['ms']:.1f} ms vs baseline {then['ms']:.1f} ms "
+                                   f"(limit {limit:.1f} ms)")
+    return regressions
+
+
+def print_table(results):
+    print(f"{'case':<34}" + "".join(f"{s:>14}" for s in STAGES) + f"{'img/s':>9}")
+    for case, stages in results.items():
+        cells = "".join(f"{stages[s]['ms']:>11.1f} ms" if s in stages else f"{'-':>14}" for s in STAGES)
+        print(f"{case:<34}{cells}{stages.get('images_per_s', '-'):>9}")
+        if "error" in stages:
+            print(f"{'':<34}stopped: {stages['error']}")
+
+
+def parse_stage_thresholds(values):
+    thresholds = {}
+    for value in values:
+        stage, _, limit = value.partition("=")
+        if stage not in STAGES or not limit:
+            raise argparse.ArgumentTypeError(f"expected <stage>=<fraction> with stage in {', '.join(STAGES)}")
+        thresholds[stage] = float(limit)
+    return thresholds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Images to run (default: every image in data/)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed runs per stage")
+    parser.add_argument("--upscale", type=float, nargs="*", default=[2.0],
+                        help="Also run copies on a canvas enlarged by these factors")
+    parser.add_argument("--pyramid", default="auto", choices=["true", "false", "auto"])
+    parser.add_argument("--sweep-angles", type=int, default=SWEEP_ANGLES, help="Shots in the sweep stage")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against this JSON file and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help=f"Allowed relative slowdown (default: baseline's, else {DEFAULT_THRESHOLD})")
+    parser.add_argument("--stage-threshold", action="append", default=[], metavar="STAGE=FRACTION",
+                        help="Per-stage override, e.g. simulate=0.5")
+    args = parser.parse_args(argv)
+
+    pyramid = {"true": True, "false": False}.get(args.pyramid, "auto")
+    paths = args.images or sorted(glob.glob(os.path.join(DATA_DIR, "*.png")) + glob.glob(os.path.join(DATA_DIR, "*.jpg")))
+    results = {}
+    for name, image in load_cases(paths, args.upscale):
+        results[name] = bench_case(image, args.repeat, pyramid, args.sweep_angles)
+    print_table(results)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+            "pyramid": args.pyramid,
+        },
+        "results": results,
+    }
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        threshold = args.threshold if args.threshold is not None else baseline.get("threshold", DEFAULT_THRESHOLD)
+        stage_thresholds = {**baseline.get("stage_thresholds", {}), **parse_stage_thresholds(args.stage_threshold)}
+        regressions = compare(results, baseline, threshold, stage_thresholds)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            status = 1
+        else:
+            print("No regressions against", args.baseline)
+
+    if args.save:
+        report["threshold"] = args.threshold if args.threshold is not None else DEFAULT_THRESHOLD
+        report["stage_thresholds"] = parse_stage_thresholds(args.stage_threshold)
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
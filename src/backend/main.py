@@ -1,67 +1,69 @@
 from Cartoonify import *
 from ImageTo2d import *
 from Border import *
+from ImageIO import frame_buffers
+from Metrics import timed
 from physics.simulatePaths import main  # We'll update simulatePaths soon
 import cv2
-from PIL import Image, ImageDraw
-import cairosvg
-import xml.etree.ElementTree as ET
 
-def svg_to_opencv_lines(svg_content):
-    # Parse the SVG file using ElementTree
-    root = ET.fromstring(svg_content)
-    lines = []
-    
-    # Extract line coordinates from the SVG
-    for line in root.findall(".//{http://www.w3.org/2000/svg}line"):
-        x1 = float(line.get('x1'))
-        y1 = float(line.get('y1'))
-        x2 = float(line.get('x2'))
-        y2 = float(line.get('y2'))
-        lines.append((x1, y1, x2, y2))
-    
-    return lines
-
-def overlay_svg_lines_on_image(image_path, svg_content):
-    # Load the image using OpenCV
-    
-    # Convert SVG lines into OpenCV compatible format
-    lines = svg_to_opencv_lines(svg_content)
-    
-    # Draw the lines on the image
-    for (x1, y1, x2, y2) in lines:
+def overlay_paths_on_image(image, segments):
+    # Draw the simulated path segments (x1, y1, x2, y2, r, g, b rows) on the image
+    for x1, y1, x2, y2 in segments[:, :4]:
         cv2.line(image, (int(x1), int(y1)), (int(x2), int(y2)), (255, 255, 255), 2)  # white lines
     
     return image
 
-def getCueTips(img, run_sim):
+def getTableView(img, camera_id=None, calibration=None):
+    """
+    Warp the frame to a bird's-eye view and find the rail edges.
+
+    With a calibration store and camera_id, a saved profile is reused: the frame
+    is remapped with its precomputed tables and its edges are trusted while the
+    felt still lines up; otherwise the full search runs and the profile is
+    (re)calibrated.
+    """
+    profile = calibration.get(camera_id) if calibration is not None and camera_id else None
+    if profile is not None and profile.matches(img):
+        width, height = profile.output_size
+        with timed("warp"):
+            birds_eye_image = profile.warp(img, dst=frame_buffers.get((height, width) + img.shape[2:]))
+        if profile.is_valid(birds_eye_image):
+            return birds_eye_image, profile.edges
 
-    birds_eye_image, corners = getOutlineAndTransform(img, padding=40)
-    print("getting cue tips")
-    cropped_img, edges = getBorder(birds_eye_image)
-    print("Got edges")
+    with timed("warp"):
+        birds_eye_image, corners = getOutlineAndTransform(img, padding=40)
+    warped = birds_eye_image.copy() if calibration is not None and camera_id else None
+    with timed("rails"):
+        cropped_img, edges = getBorder(birds_eye_image)
+
+    if warped is not None and edges is not None:
+        calibration.calibrate(camera_id, img, corners, edges, warped)
+    return birds_eye_image, edges
+
+def getCueTips(img, run_sim, pyramid=False, camera_id=None, calibration=None, tracker=None, render=True,
+               show=False):
+
+    birds_eye_image, edges = getTableView(img, camera_id=camera_id, calibration=calibration)
     
-    cartoon_img, pool_balls, avg_radius, pockets = cartoonify(birds_eye_image, edges)
+    cartoon_img, table, pockets = cartoonify(birds_eye_image, edges, pyramid=pyramid, tracker=tracker,
+                                             render=render or run_sim)
 
-    tempfile_svg_name = ''
+    segments = None
     cue_ball_coords = (0,0) 
     if run_sim:
-        tempfile_svg_name, cue_ball_coords = main(pool_balls, wall_cords=edges, ball_radius=avg_radius, cue_angle=45, show_simulation=True)   
-         
-    with open(tempfile_svg_name, 'r') as file:
-        svg_content = file.read()
-    
-    print(svg)
-    path_img = overlay_svg_lines_on_image(cartoon_img, svg_content) 
-    cv2.imshow("path", path_img)
-    cv2.waitKey(0)
+        segments, cue_ball_coords = main(table, cue_angle=45, show_simulation=show)
+
+        if show:
+            path_img = overlay_paths_on_image(cartoon_img.copy(), segments) 
+            cv2.imshow("path", path_img)
+            cv2.waitKey(0)
     
-    return cartoon_img, tempfile_svg_name, cue_ball_coords, (pool_balls, edges, avg_radius)
+    return cartoon_img, segments, cue_ball_coords, table
 
 
 if __name__ == '__main__':
     img = cv2.imread("data/pool_table_overhead.png")
-    getCueTips(img, run_sim=True)
+    getCueTips(img, run_sim=True, show=True)
     
   
     # birds_eye_image, corners = getOutlineAndTransform(img, padding=40)
@@ -0,0 +1,245 @@
+import time
+
+import numpy as np
+
+from physics.simulatePaths import (split_cue_ball, POCKET_RADIUS, REST_VELOCITY_EPSILON, MIN_TIME_STEP,
+                                   MAX_TIME_STEP, MAX_TRAVEL_PER_STEP)
+
+# Match the constants used by the pymunk simulation in simulatePaths
+FRICTION_COEFFICIENT = 0.7
+WALL_RADIUS = 5
+BALL_ELASTICITY = 0.9
+WALL_ELASTICITY = 0.9
+MAX_STEPS = 10_000
+
+
+def build_table_arrays(table):
+    """
+    Reorder a TableState into the ball order main() uses: every object ball
+    first, the cue ball last.
+
+    Returns:
+        tuple: (positions (N, 2), colors, source indices, walls (W, 2, 2), pockets (P, 2), radius)
+    """
+    if table.edges is None:
+        raise ValueError("Wall coordinates must be provided.")
+    cue, remaining = split_cue_ball(table)
+    source_index = remaining + [cue]
+
+    positions = table.positions[source_index]
+    colors = [tuple(int(c) for c in table.colors[i]) for i in remaining] + [(255, 255, 255)]
+    walls = np.array(table.edges, dtype=np.float64)
+    return positions, colors, source_index, walls, table.pockets, table.radius
+
+
+def _wall_lines(walls):
+    """
+    Unit normal and offset of the infinite line through every wall segment, so
+    the distance of a point p from the line is |p . normal - offset|.
+
+    Returns:
+        tuple: (normals (W, 2), offsets (W,))
+    """
+    ab = walls[:, 1] - walls[:, 0]
+    length = np.maximum(np.hypot(ab[:, 0], ab[:, 1]), 1e-12)
+    normals = np.stack([-ab[:, 1], ab[:, 0]], axis=1) / length[:, None]
+    return normals, np.einsum("wk,wk->w", walls[:, 0], normals)
+
+
+def _wall_contacts(pos, walls, normals, offsets, reach):
+    """
+    Ball-wall pairs closer than reach. Only pairs within reach of the wall's
+    infinite line (one (S, N, W) product) get the exact closest point on the
+    segment, so the per-step cost no longer carries a (S, N, W, 2) term.
+
+    Returns:
+        tuple: (shot, ball, wall) index arrays of the touching pairs, and the
+        unit normal pointing from the wall to the ball for each (K, 2).
+    """
+    near = np.abs(pos @ normals.T - offsets) < reach
+    s, b, w = np.nonzero(near)
+    a = walls[w, 0]
+    ab = walls[w, 1] - a
+    t = np.clip(np.einsum("kd,kd->k", pos[s, b] - a, ab) / np.maximum(np.einsum("kd,kd->k", ab, ab), 1e-12), 0.0, 1.0)
+    delta = pos[s, b] - (a + t[:, None] * ab)
+    dist = np.hypot(delta[:, 0], delta[:, 1])
+    touching = dist < reach
+    normal = delta[touching] / np.maximum(dist[touching], 1e-12)[:, None]
+    return s[touching], b[touching], w[touching], normal
+
+
+def simulate_batch(table, shots, max_steps=MAX_STEPS, starts=None, deadline=None):
+    """
+    Simulate many cue shots on the same table at once.
+
+    Every shot starts from the same layout and all of them are advanced together
+    as (shots, balls) arrays with the same friction, restitution, rest speed and
+    adaptive step as run_game: each shot takes the largest step that keeps its
+    fastest ball within MAX_TRAVEL_PER_STEP radii. Shots drop out of the working
+    arrays as soon as every ball on them is at rest. Segments are recorded on
+    the same events as on_collision_ball_ball and on_collision_ball_wall: when a
+    contact begins, the ball's path since its previous contact is appended as
+    (start_pos, end_pos, color).
+
+    Args:
+        table (TableState): Detected balls, including the cue ball, and rails.
+        shots (List[Tuple[float, float]]): (cue_angle in degrees, speed) pairs.
+        max_steps (int, optional): Hard cap on simulation steps per batch.
+        starts (array, optional): (shots, len(table), 2) start positions in
+            table order, replacing the detected positions shot by shot.
+        deadline (float, optional): time.time() after which no further step
+            runs; an absolute wall-clock time so it holds across pool workers.
+
+    Returns:
+        List[dict]: One result per shot with keys "angle", "speed", "collisions",
+        "potted" (indices into the table), "pockets" (the pocket index, as in
+        get_pocket_positions, each potted ball dropped into), "scratch", "steps"
+        and "truncated" (None, "max_steps" or "deadline" for a shot whose balls
+        were still rolling when the batch stopped).
+    """
+    shots = [(float(angle), float(speed)) for angle, speed in shots]
+    if not shots:
+        return []
+
+    start, colors, source_index, walls, pockets, radius = build_table_arrays(table)
+    n_shots, n_balls = len(shots), len(start)
+    cue = n_balls - 1
+
+    if starts is None:
+        pos = np.repeat(start[None], n_shots, axis=0)
+    else:
+        starts = np.asarray(starts, dtype=np.float64)
+        if starts.shape != (n_shots, n_balls, 2):
+            raise ValueError(f"starts must have shape ({n_shots}, {n_balls}, 2), got {starts.shape}")
+        pos = starts[:, source_index].copy()
+    vel = np.zeros_like(pos)
+    angles = np.radians([angle for angle, _ in shots])
+    speeds = np.array([speed for _, speed in shots])
+    vel[:, cue, 0] = speeds * np.cos(angles)
+    vel[:, cue, 1] = speeds * np.sin(angles)
+
+    # Working arrays hold only the shots still running; active maps their rows to shot indices
+    active = np.arange(n_shots)
+    on_table = np.ones((n_shots, n_balls), dtype=bool)
+    last_pos = pos.copy()
+    ball_touch = np.zeros((n_shots, n_balls, n_balls), dtype=bool)
+    wall_touch = np.zeros((n_shots, n_balls, len(walls)), dtype=bool)
+    upper = np.triu(np.ones((n_balls, n_balls), dtype=bool), 1)  # Each pair once, as (i, j) with i < j
+
+    final_on_table = np.ones((n_shots, n_balls), dtype=bool)
+    pocket_of = np.full((n_shots, n_balls), -1)
+    steps = np.zeros(n_shots, dtype=int)
+    collisions = [[] for _ in range(n_shots)]
+    ball_e = BALL_ELASTICITY * BALL_ELASTICITY
+    wall_e = BALL_ELASTICITY * WALL_ELASTICITY
+    rest2 = REST_VELOCITY_EPSILON ** 2
+    contact2 = (2 * radius) ** 2
+    pocket2 = (radius + POCKET_RADIUS) ** 2
+    wall_normals, wall_offsets = _wall_lines(walls)
+
+    def record(row, b):
+        end = (float(pos[row, b, 0]), float(pos[row, b, 1]))
+        begin = (float(last_pos[row, b, 0]), float(last_pos[row, b, 1]))
+        if begin != end:
+            collisions[active[row]].append((begin, end, colors[b]))
+        last_pos[row, b] = pos[row, b]
+
+    cut_short = "max_steps"
+    for _ in range(max_steps):
+        if deadline is not None and time.time() > deadline:
+            cut_short = "deadline"
+            break
+
+        # Balls slower than the rest speed stop outright, as in run_game
+        speed2 = np.einsum("snk,snk->sn", vel, vel)
+        resting = speed2 < rest2
+        vel[resting] = 0.0
+        speed2[resting] = 0.0
+        max_speed2 = speed2.max(axis=1)
+
+        stopped = max_speed2 == 0.0
+        if stopped.any():
+            final_on_table[active[stopped]] = on_table[stopped]
+            keep = ~stopped
+            active, pos, vel, on_table, last_pos = active[keep], pos[keep], vel[keep], on_table[keep], last_pos[keep]
+            ball_touch, wall_touch = ball_touch[keep], wall_touch[keep]
+            speed2, max_speed2 = speed2[keep], max_speed2[keep]
+            if not len(active):
+                break
+        steps[active] += 1
+
+        # Per-shot step from its fastest ball, then friction and integration (run_game + space.step)
+        dt = np.clip(MAX_TRAVEL_PER_STEP * radius / np.sqrt(max_speed2), MIN_TIME_STEP, MAX_TIME_STEP)
+        speed = np.sqrt(speed2)
+        moving = speed > 0
+        scale = np.where(moving, np.maximum(0.0, speed - FRICTION_COEFFICIENT * 9.8 * dt[:, None])
+                         / np.where(moving, speed, 1.0), 0.0)
+        vel *= scale[..., None]
+        pos += vel * dt[:, None, None]  # Pocketed balls have zero velocity
+
+        # Ball-ball contacts
+        delta = pos[:, None, :, :] - pos[:, :, None, :]          # (S, N, N, 2): j - i
+        dist2 = np.einsum("sijk,sijk->sij", delta, delta)
+        touching = (dist2 < contact2) & on_table[:, :, None] & on_table[:, None, :] & upper
+        began = touching & ~ball_touch
+        ball_touch = touching
+
+        # Ball-wall contacts
+        ws, wb, ww, wall_normal = _wall_contacts(pos, walls, wall_normals, wall_offsets, radius + WALL_RADIUS)
+        keep = on_table[ws, wb]
+        ws, wb, ww, wall_normal = ws[keep], wb[keep], ww[keep], wall_normal[keep]
+        wall_touching = np.zeros_like(wall_touch)
+        wall_touching[ws, wb, ww] = True
+        wall_began = wall_touching & ~wall_touch
+        wall_touch = wall_touching
+
+        # Record segments in the order pymunk would report them
+        for row, i, j in zip(*np.nonzero(began)):
+            record(row, i)
+            record(row, j)
+        for row, b in zip(*np.nonzero(wall_began.any(axis=2))):
+            record(row, b)
+
+        # Resolve ball-ball impulses for approaching pairs (equal masses), all from pre-contact velocities
+        rows, i, j = np.nonzero(touching)
+        if len(rows):
+            normal = delta[rows, i, j] / np.sqrt(np.maximum(dist2[rows, i, j], 1e-24))[:, None]
+            approach = np.einsum("kd,kd->k", vel[rows, j] - vel[rows, i], normal)
+            impulse = np.where(approach < 0, -(1 + ball_e) / 2 * approach, 0.0)[:, None] * normal
+            np.add.at(vel, (rows, i), -impulse)
+            np.add.at(vel, (rows, j), impulse)
+
+        # Resolve rail impulses
+        if len(ws):
+            into = np.einsum("kd,kd->k", vel[ws, wb], wall_normal)
+            impulse = np.where(into < 0, -(1 + wall_e) * into, 0.0)
+            np.add.at(vel, (ws, wb), impulse[:, None] * wall_normal)
+
+        # Pockets remove balls from the table
+        to_pocket = pos[:, :, None, :] - pockets
+        pocket_dist2 = np.einsum("snpk,snpk->snp", to_pocket, to_pocket)
+        sunk = (pocket_dist2 < pocket2).any(axis=2) & on_table
+        if sunk.any():
+            rows, balls = np.nonzero(sunk)
+            pocket_of[active[rows], balls] = pocket_dist2[rows, balls].argmin(axis=1)
+            on_table &= ~sunk
+            vel[sunk] = 0.0
+
+    # Shots still in the working arrays with a ball rolling were cut short by max_steps or the deadline
+    final_on_table[active] = on_table
+    truncated = np.zeros(n_shots, dtype=bool)
+    truncated[active] = (np.einsum("snk,snk->sn", vel, vel) >= rest2).any(axis=1)
+    results = []
+    for s, (angle, speed) in enumerate(shots):
+        sunk_balls = [b for b in range(n_balls) if not final_on_table[s, b]]
+        results.append({
+            "angle": angle,
+            "speed": speed,
+            "collisions": collisions[s],
+            "potted": [source_index[b] for b in sunk_balls],
+            "pockets": [int(pocket_of[s, b]) for b in sunk_balls],
+            "scratch": not bool(final_on_table[s, cue]),
+            "steps": int(steps[s]),
+            "truncated": cut_short if truncated[s] else None,
+        })
+    return results
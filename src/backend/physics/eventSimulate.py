@@ -0,0 +1,295 @@
+import math
+import numpy as np
+
+from physics.batchSimulate import (
+    build_table_arrays,
+    FRICTION_COEFFICIENT,
+    WALL_RADIUS,
+    BALL_ELASTICITY,
+    WALL_ELASTICITY,
+)
+from physics.simulatePaths import POCKET_RADIUS
+
+DECELERATION = FRICTION_COEFFICIENT * 9.8
+EPSILON = 1e-9
+MAX_EVENTS = 2_000
+
+
+def _real_roots(coefficients, t_max):
+    """Real roots of a polynomial in (0, t_max], ascending."""
+    coefficients = np.trim_zeros(np.asarray(coefficients, dtype=np.float64), "f")
+    if len(coefficients) < 2:
+        return []
+    roots = np.roots(coefficients)
+    real = roots[np.abs(roots.imag) < 1e-7].real
+    return sorted(t for t in real if EPSILON < t <= t_max + EPSILON)
+
+
+class _Ball:
+    """
+    Analytic motion of one ball under constant sliding friction.
+
+    Between events the position is p(t) = p0 + v0 * dt + c * dt^2 with
+    c = -a/2 * v0/|v0|, valid until the ball stops at dt = |v0| / a.
+    """
+
+    def __init__(self, position, velocity, t0=0.0):
+        self.reset(position, velocity, t0)
+
+    def reset(self, position, velocity, t0):
+        self.p0 = np.asarray(position, dtype=np.float64)
+        self.v0 = np.asarray(velocity, dtype=np.float64)
+        self.t0 = t0
+        speed = float(np.hypot(*self.v0))
+        if speed <= EPSILON:
+            self.v0 = np.zeros(2)
+            self.c = np.zeros(2)
+            self.stop = 0.0
+        else:
+            self.c = -0.5 * DECELERATION * self.v0 / speed
+            self.stop = speed / DECELERATION
+
+    def state(self, t):
+        """Position and velocity at absolute time t."""
+        dt = min(max(t - self.t0, 0.0), self.stop)
+        position = self.p0 + self.v0 * dt + self.c * dt * dt
+        velocity = self.v0 + 2 * self.c * dt if dt < self.stop else np.zeros(2)
+        return position, velocity
+
+    def moving_at(self, t):
+        return t - self.t0 < self.stop - EPSILON
+
+    def coefficients(self, t):
+        """(p, v, c, remaining moving time) re-based to absolute time t."""
+        position, velocity = self.state(t)
+        if not self.moving_at(t):
+            return position, np.zeros(2), np.zeros(2), 0.0
+        return position, velocity, self.c, self.stop - (t - self.t0)
+
+
+def _ball_ball_time(a, b, now, reach):
+    """Earliest absolute time at which balls a and b come into contact while approaching."""
+    pa, va, ca, ta = a.coefficients(now)
+    pb, vb, cb, tb = b.coefficients(now)
+    if ta == 0.0 and tb == 0.0:
+        return None
+
+    d = pb - pa
+    if np.dot(d, d) <= reach * reach and np.dot(d, vb - va) < 0:
+        return now
+
+    # Piecewise: both moving until the first one stops, then only one moves
+    start = 0.0
+    for end in sorted({min(ta, tb), max(ta, tb)}):
+        if end <= start:
+            continue
+        A = pb - pa
+        B = vb - va
+        C = cb - ca
+        quartic = [
+            np.dot(C, C),
+            2 * np.dot(B, C),
+            np.dot(B, B) + 2 * np.dot(A, C),
+            2 * np.dot(A, B),
+            np.dot(A, A) - reach * reach,
+        ]
+        for t in _real_roots(quartic, end - start):
+            if np.dot(A + B * t + C * t * t, B + 2 * C * t) < 0:
+                return now + start + t
+
+        # Advance to the next piece
+        pa, va = pa + va * (end - start) + ca * (end - start) ** 2, va + 2 * ca * (end - start)
+        pb, vb = pb + vb * (end - start) + cb * (end - start) ** 2, vb + 2 * cb * (end - start)
+        if ta <= end + EPSILON:
+            va, ca = np.zeros(2), np.zeros(2)
+        if tb <= end + EPSILON:
+            vb, cb = np.zeros(2), np.zeros(2)
+        start = end
+    return None
+
+
+def _ball_rail_time(ball, now, point, normal, reach):
+    """Earliest absolute time at which the ball reaches a rail line while moving into it."""
+    p, v, c, remaining = ball.coefficients(now)
+    if remaining == 0.0:
+        return None
+
+    gap = np.dot(p - point, normal) - reach
+    if gap <= 0 and np.dot(v, normal) < 0:
+        return now
+
+    for t in _real_roots([np.dot(c, normal), np.dot(v, normal), gap], remaining):
+        if np.dot(v + 2 * c * t, normal) < 0:
+            return now + t
+    return None
+
+
+def _ball_pocket_time(ball, now, centre, reach):
+    """Earliest absolute time at which the ball's centre enters a pocket's capture circle."""
+    p, v, c, remaining = ball.coefficients(now)
+    if remaining == 0.0:
+        return None
+
+    offset = p - centre
+    if np.dot(offset, offset) < reach * reach:
+        return now
+
+    # Motion is along a straight line: p + u * s with s(t) = |v| t - a t^2 / 2
+    speed = float(np.hypot(*v))
+    u = v / speed
+    half_b = np.dot(offset, u)
+    disc = half_b * half_b - (np.dot(offset, offset) - reach * reach)
+    if disc < 0:
+        return None
+    s = -half_b - math.sqrt(disc)
+    travel = speed * speed / (2 * DECELERATION)
+    if s <= 0 or s > travel:
+        return None
+    return now + (speed - math.sqrt(max(speed * speed - 2 * DECELERATION * s, 0.0))) / DECELERATION
+
+
+def _rail_lines(walls):
+    """Point and inward unit normal for every rail, facing the table centre."""
+    centre = walls.reshape(-1, 2).mean(axis=0)
+    rails = []
+    for a, b in walls:
+        direction = b - a
+        length = np.hypot(*direction)
+        if length <= EPSILON:
+            continue
+        normal = np.array([-direction[1], direction[0]]) / length
+        if np.dot(centre - a, normal) < 0:
+            normal = -normal
+        rails.append((a, normal))
+    return rails
+
+
+def simulate_events(table, cue_angle=0, speed=200, max_events=MAX_EVENTS):
+    """
+    Event-driven (time-of-impact) simulation of a single shot.
+
+    Instead of stepping at a fixed 1/50 s, the next ball-ball, ball-rail or
+    ball-pocket event is solved analytically under constant friction
+    deceleration and the clock jumps straight to it. Cost scales with the number
+    of collisions rather than the shot duration, and fast balls cannot tunnel
+    through each other or the rails.
+
+    Args:
+        table (TableState): Detected balls, including the cue ball, and rails.
+        cue_angle (float, optional): Cue direction in degrees. Defaults to 0.
+        speed (float, optional): Initial cue ball speed. Defaults to 200.
+        max_events (int, optional): Safety cap on processed events.
+
+    Returns:
+        dict: "collisions" segments in the same (start, end, color) format as the
+        pymunk handlers, plus "potted", "scratch", "events", "duration" and
+        "truncated" ("max_events" if the cap was hit, else None).
+    """
+    start, colors, source_index, walls, pockets, radius = build_table_arrays(table)
+    cue = len(start) - 1
+    rails = _rail_lines(walls)
+
+    angle = math.radians(cue_angle)
+    balls = [_Ball(p, (0.0, 0.0)) for p in start]
+    balls[cue].reset(start[cue], (speed * math.cos(angle), speed * math.sin(angle)), 0.0)
+
+    on_table = [True] * len(balls)
+    last_pos = [tuple(map(float, p)) for p in start]
+    collisions = []
+    ball_e = BALL_ELASTICITY * BALL_ELASTICITY
+    wall_e = BALL_ELASTICITY * WALL_ELASTICITY
+
+    def record(i, position):
+        end = (float(position[0]), float(position[1]))
+        if last_pos[i] != end:
+            collisions.append((last_pos[i], end, colors[i]))
+        last_pos[i] = end
+
+    # Next event per ball-pair / ball; only rows touching a changed ball are recomputed
+    pair_events = {}
+    solo_events = {}
+
+    def refresh(i, now):
+        for j in range(len(balls)):
+            if j == i:
+                continue
+            key = (min(i, j), max(i, j))
+            t = None
+            if on_table[i] and on_table[j]:
+                t = _ball_ball_time(balls[key[0]], balls[key[1]], now, 2 * radius)
+            pair_events[key] = t
+
+        best = None
+        if on_table[i]:
+            for k, (point, normal) in enumerate(rails):
+                t = _ball_rail_time(balls[i], now, point, normal, radius + WALL_RADIUS)
+                if t is not None and (best is None or t < best[0]):
+                    best = (t, "rail", k)
+            for k, centre in enumerate(pockets):
+                t = _ball_pocket_time(balls[i], now, centre, radius + POCKET_RADIUS)
+                if t is not None and (best is None or t < best[0]):
+                    best = (t, "pocket", k)
+        solo_events[i] = best
+
+    now = 0.0
+    for i in range(len(balls)):
+        refresh(i, now)
+
+    events = 0
+    truncated = None
+    while True:
+        if events >= max_events:
+            truncated = "max_events"
+            break
+        pair = min(((t, key) for key, t in pair_events.items() if t is not None), default=None)
+        solo = min(((event[0], i, event) for i, event in solo_events.items() if event is not None), default=None)
+        if pair is None and solo is None:
+            break
+        events += 1
+
+        if solo is None or (pair is not None and pair[0] <= solo[0]):
+            now, (i, j) = pair
+            pi, vi = balls[i].state(now)
+            pj, vj = balls[j].state(now)
+            normal = (pj - pi) / max(np.hypot(*(pj - pi)), EPSILON)
+            approach = np.dot(vj - vi, normal)
+            impulse = -(1 + ball_e) / 2 * approach if approach < 0 else 0.0
+            record(i, pi)
+            record(j, pj)
+            balls[i].reset(pi, vi - impulse * normal, now)
+            balls[j].reset(pj, vj + impulse * normal, now)
+            changed = (i, j)
+        else:
+            now, i, (_, kind, k) = solo
+            position, velocity = balls[i].state(now)
+            if kind == "rail":
+                normal = rails[k][1]
+                into = np.dot(velocity, normal)
+                if into < 0:
+                    velocity = velocity - (1 + wall_e) * into * normal
+                record(i, position)
+                balls[i].reset(position, velocity, now)
+            else:
+                record(i, position)
+                on_table[i] = False
+                balls[i].reset(position, (0.0, 0.0), now)
+            changed = (i,)
+
+        for i in changed:
+            refresh(i, now)
+
+    duration = max((b.t0 + b.stop for b in balls), default=0.0)
+    end = now if truncated else duration  # A truncated shot is only drawn up to its last event
+    for i in range(len(balls)):
+        if on_table[i]:
+            record(i, balls[i].state(end)[0])
+    return {
+        "angle": float(cue_angle),
+        "speed": float(speed),
+        "collisions": collisions,
+        "potted": [source_index[b] for b in range(len(balls)) if not on_table[b]],
+        "scratch": not on_table[cue],
+        "events": events,
+        "duration": duration,
+        "truncated": truncated,
+    }
@@ -0,0 +1,77 @@
+import numpy as np
+import svgwrite
+
+# One row per recorded segment: x1, y1, x2, y2, r, g, b
+SEGMENT_COLUMNS = 7
+PATH_FORMATS = ("svg", "json", "binary")
+
+
+def segments_to_array(collisions):
+    """
+    Pack (start, end, color) segments from the collision handlers into an
+    (N, 7) float32 array.
+    """
+    segments = np.empty((len(collisions), SEGMENT_COLUMNS), dtype=np.float32)
+    for i, (start, end, color) in enumerate(collisions):
+        segments[i] = (start[0], start[1], end[0], end[1], color[0], color[1], color[2])
+    return segments
+
+
+def paths_to_svg(segments, WIDTH, HEIGHT):
+    """Render segments as an SVG document string with one <polyline> per continuous path."""
+    dwg = svgwrite.Drawing(profile='tiny', size=(str(WIDTH), str(HEIGHT)))
+    for line in paths_to_polylines(segments):
+        r, g, b = line["color"]
+        dwg.add(dwg.polyline(
+            points=[tuple(point) for point in line["points"]],
+            stroke=f'rgb({r},{g},{b})',
+            stroke_width=2,
+            fill='none'
+        ))
+    return dwg.tostring()
+
+
+def paths_to_polylines(segments, precision=1):
+    """
+    Merge segments that continue each other (same colour, end == next start)
+    into polylines.
+
+    Returns:
+        List[dict]: {"color": [r, g, b], "points": [[x, y], ...]} per polyline.
+    """
+    polylines = []
+    open_lines = {}
+    for x1, y1, x2, y2, r, g, b in np.asarray(segments).tolist():
+        color = (int(r), int(g), int(b))
+        start = [round(x1, precision), round(y1, precision)]
+        end = [round(x2, precision), round(y2, precision)]
+
+        line = open_lines.get(color)
+        if line is not None and line["points"][-1] == start:
+            line["points"].append(end)
+        else:
+            line = {"color": list(color), "points": [start, end]}
+            polylines.append(line)
+            open_lines[color] = line
+    return polylines
+
+
+def paths_to_bytes(segments):
+    """Little-endian float32 rows of (x1, y1, x2, y2, r, g, b)."""
+    return np.ascontiguousarray(segments, dtype='<f4').tobytes()
+
+
+def serialize_paths(segments, fmt, WIDTH, HEIGHT):
+    """
+    Serialize segments in one of PATH_FORMATS.
+
+    Returns:
+        str | list | bytes: SVG string, JSON-ready polylines or packed bytes.
+    """
+    if fmt == "svg":
+        return paths_to_svg(segments, WIDTH, HEIGHT)
+    if fmt == "json":
+        return paths_to_polylines(segments)
+    if fmt == "binary":
+        return paths_to_bytes(segments)
+    raise ValueError(f"Unknown path format: {fmt}")
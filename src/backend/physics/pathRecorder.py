@@ -0,0 +1,116 @@
+import numpy as np
+
+from physics.pathFormat import SEGMENT_COLUMNS
+
+DEFAULT_CAPACITY = 1024  # Points per ball before the buffers grow
+DEFAULT_TOLERANCE = 0.5  # Pixels a simplified path may deviate from the recorded one
+MIN_TOLERANCE = 0.05  # Where the search for a tolerance that meets max_points starts when none is given
+
+
+def _segment_distances(points, a, b):
+    """Distance of every point to the segment a-b (not the infinite line, so rebounds keep their turn)."""
+    ab = b - a
+    length2 = float(ab @ ab)
+    if length2 == 0.0:
+        return np.hypot(*(points - a).T)
+    t = np.clip((points - a) @ ab / length2, 0.0, 1.0)
+    return np.hypot(*(points - (a + t[:, None] * ab)).T)
+
+
+def simplify(points, tolerance, max_points=None):
+    """
+    Douglas-Peucker simplification of a polyline.
+
+    Args:
+        points (numpy array): (N, 2) points in order.
+        tolerance (float): Largest distance any dropped point may lie from the
+            simplified path.
+        max_points (int, optional): Upper bound on the result (at least 2); the
+            tolerance is doubled, starting from MIN_TOLERANCE if it is zero,
+            until the path fits.
+
+    Returns:
+        numpy array: The kept points, always including the first and last.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3:
+        return points
+    if max_points is not None:
+        max_points = max(2, int(max_points))
+    while True:
+        keep = np.zeros(len(points), dtype=bool)
+        keep[0] = keep[-1] = True
+        stack = [(0, len(points) - 1)]
+        while stack:
+            first, last = stack.pop()
+            if last - first < 2:
+                continue
+            distances = _segment_distances(points[first + 1:last], points[first], points[last])
+            worst = int(np.argmax(distances))
+            if distances[worst] > tolerance:
+                split = first + 1 + worst
+                keep[split] = True
+                stack.append((first, split))
+                stack.append((split, last))
+        if max_points is None or keep.sum() <= max_points:
+            return points[keep]
+        tolerance = max(2 * tolerance, MIN_TOLERANCE)
+
+
+class PathRecorder:
+    """
+    Full trajectories of a fixed set of balls, one preallocated (capacity, 2)
+    buffer per ball that is reused shot after shot. The simulation loop calls
+    record() for each ball that moved in a step; buffers double if a shot
+    outgrows them.
+    """
+
+    def __init__(self, colors, capacity=DEFAULT_CAPACITY):
+        self.colors = [tuple(int(c) for c in color) for color in colors]
+        self.points = np.empty((len(self.colors), capacity, 2), dtype=np.float32)
+        self.counts = [0] * len(self.colors)
+
+    def reset(self, positions):
+        """Start a new shot with every ball at its given position."""
+        self.points[:, 0] = positions
+        self.counts = [1] * len(self.colors)
+
+    def record(self, ball, position):
+        """Append a position to one ball's trajectory."""
+        count = self.counts[ball]
+        if count == self.points.shape[1]:
+            grown = np.empty((len(self.colors), 2 * count, 2), dtype=np.float32)
+            grown[:, :count] = self.points
+            self.points = grown
+        self.points[ball, count] = position
+        self.counts[ball] = count + 1
+
+    def recorded_segments(self):
+        """Segments between consecutive recorded points, before any simplification."""
+        return sum(count - 1 for count in self.counts if count > 1)
+
+    def trajectory(self, ball):
+        return self.points[ball, :self.counts[ball]]
+
+    def to_segments(self, tolerance=DEFAULT_TOLERANCE, max_points=None):
+        """
+        Every ball's simplified trajectory as consecutive segment rows.
+
+        Returns:
+            numpy.ndarray: (N, 7) float32 segments, see physics.pathFormat; the
+            rows of one ball are contiguous, so paths_to_polylines rebuilds one
+            polyline per ball.
+        """
+        parts = []
+        for ball, color in enumerate(self.colors):
+            if self.counts[ball] < 2:
+                continue
+            points = simplify(self.trajectory(ball), tolerance, max_points)
+            rows = np.empty((len(points) - 1, SEGMENT_COLUMNS), dtype=np.float32)
+            rows[:, 0:2] = points[:-1]
+            rows[:, 2:4] = points[1:]
+            rows[:, 4:7] = color
+            parts.append(rows)
+        if not parts:
+            return np.empty((0, SEGMENT_COLUMNS), dtype=np.float32)
+        return np.concatenate(parts)
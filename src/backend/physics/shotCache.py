@@ -0,0 +1,74 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def shot_key(table, **shot_params):
+    """
+    Digest of the TableState (see TableState.key) plus the shot parameters,
+    exactly as the simulation will see them.
+    """
+    params = tuple(sorted(shot_params.items()))
+    return hashlib.blake2b(repr((table.key, params)).encode(), digest_size=16).hexdigest()
+
+
+class ShotCache:
+    """
+    Bounded LRU of simulation results with hit/miss counters.
+
+    Only deterministic shots (explicit speed or seed) should be stored; a
+    random-speed shot would otherwise be replayed forever.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_run(self, key, run, cacheable=None):
+        """
+        Return the cached result for key, or call run() and cache what it
+        returns unless cacheable(result) is False.
+        """
+        value = self.get(key)
+        if value is None:
+            value = run()
+            if cacheable is None or cacheable(value):
+                self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,133 @@
+import time
+
+import numpy as np
+
+from physics.batchSimulate import simulate_batch
+
+DEFAULT_SAMPLES = 256
+MAX_SAMPLES = 4096
+BATCH_SIZE = 128         # Most perturbed shots simulated per round
+PROBE_SIZE = 16          # Shots in the first round, timed to size the later ones to the budget
+TIME_BUDGET = 1.5        # Wall-clock seconds; later rounds are sized to it and stopped at it
+ANGLE_SIGMA = 0.5        # Degrees of cue angle jitter (one standard deviation)
+SPEED_SIGMA = 0.05       # Fraction of the nominal speed
+POSITION_SIGMA = 0.1     # Fraction of the ball radius; HoughCircles at dp=1 places centres within a pixel or two
+DENSITY_CELL = 20        # Pixels per side of a path-density cell
+
+
+def perturbed_shots(table, angle, speed, count, rng, angle_sigma=ANGLE_SIGMA, speed_sigma=SPEED_SIGMA,
+                    position_sigma=POSITION_SIGMA):
+    """
+    Gaussian variants of one shot.
+
+    Returns:
+        tuple: (list of (angle, speed) shots, (count, len(table), 2) start positions)
+    """
+    angles = angle + rng.normal(0.0, angle_sigma, count)
+    speeds = np.maximum(speed * (1.0 + rng.normal(0.0, speed_sigma, count)), 0.0)
+    starts = table.positions + rng.normal(0.0, position_sigma * table.radius, (count, len(table), 2))
+    return [(float(a), float(s)) for a, s in zip(angles, speeds)], starts
+
+
+def _table_bounds(edges):
+    points = np.array(edges, dtype=np.float64).reshape(-1, 2)
+    return points.min(axis=0), points.max(axis=0)
+
+
+def _visited_cells(segments, origin, cell, shape):
+    """Flat indices of the grid cells a shot's path segments pass through."""
+    visited = set()
+    rows, cols = shape
+    for start, end, _ in segments:
+        start, end = np.asarray(start, dtype=np.float64), np.asarray(end, dtype=np.float64)
+        samples = max(2, int(np.linalg.norm(end - start) / (cell / 2)) + 2)
+        points = start + np.linspace(0.0, 1.0, samples)[:, None] * (end - start)
+        col = np.clip(((points[:, 0] - origin[0]) // cell).astype(int), 0, cols - 1)
+        row = np.clip(((points[:, 1] - origin[1]) // cell).astype(int), 0, rows - 1)
+        visited.update((row * cols + col).tolist())
+    return visited
+
+
+def estimate_robustness(table, angle, speed, samples=DEFAULT_SAMPLES, seed=None,
+                        time_budget=TIME_BUDGET, angle_sigma=ANGLE_SIGMA, speed_sigma=SPEED_SIGMA,
+                        position_sigma=POSITION_SIGMA, cell=DENSITY_CELL, batch_size=BATCH_SIZE,
+                        probe_size=PROBE_SIZE, simulate=None):
+    """
+    Estimate how forgiving a shot is by simulating jittered copies of it.
+
+    Each variant perturbs the cue angle, the speed and every detected ball
+    position, and all variants go through the batch simulator in rounds until
+    samples have run or time_budget is spent. The first round is a small probe
+    of probe_size shots that always runs to completion; its time per shot sizes
+    every later round (at most batch_size) to what the remaining budget can
+    hold, and those rounds carry the deadline into the simulator, whose
+    unfinished shots are discarded. Paths are summarised as the fraction of
+    runs that crossed each cell of a coarse grid instead of being returned one
+    by one.
+
+    Args:
+        table (TableState): Detected balls, including the cue ball, and rails.
+        angle (float): Nominal cue angle in degrees.
+        speed (float): Nominal cue speed.
+        samples (int, optional): Perturbed shots to simulate, at most MAX_SAMPLES.
+        seed (int, optional): Seed for the perturbations.
+        time_budget (float, optional): Wall-clock seconds for the whole estimate.
+        cell (int, optional): Side of a path-density cell in pixels.
+        batch_size (int, optional): Most shots per round.
+        probe_size (int, optional): Shots in the first, timing round.
+        simulate (callable, optional): Runs (shots, starts, deadline) and
+            returns simulate_batch results; defaults to simulate_batch in-process.
+
+    Returns:
+        dict: "samples" run, "pot_probability" (an object ball potted without
+        scratching), "scratch_probability", per-ball "balls" probabilities,
+        "density" ({"origin", "cell", "shape", "cells": [[row, col, p], ...]}),
+        "budget_exhausted" and "elapsed_ms".
+    """
+    start_time = time.perf_counter()
+    samples = max(1, min(int(samples), MAX_SAMPLES))
+    if simulate is None:
+        def simulate(shots, starts, deadline):
+            return simulate_batch(table, shots, starts=starts, deadline=deadline)
+
+    rng = np.random.default_rng(seed)
+    origin, far_corner = _table_bounds(table.edges)
+    shape = (max(1, int(np.ceil((far_corner[1] - origin[1]) / cell))),
+             max(1, int(np.ceil((far_corner[0] - origin[0]) / cell))))
+    density = np.zeros(shape[0] * shape[1], dtype=np.int64)
+    ball_pots = np.zeros(len(table), dtype=np.int64)
+    run = pots = scratches = 0
+    deadline = time.time() + time_budget  # Wall-clock, so it holds inside pool workers too
+    count, per_shot = max(1, min(probe_size, batch_size, samples)), None
+
+    while run < samples:
+        if per_shot is not None:
+            remaining = time_budget - (time.perf_counter() - start_time)
+            if remaining < per_shot:
+                break
+            count = min(batch_size, samples - run, int(remaining / per_shot))
+        shots, starts = perturbed_shots(table, angle, speed, count, rng, angle_sigma, speed_sigma, position_sigma)
+        round_start = time.perf_counter()
+        results = simulate(shots, starts, None if per_shot is None else deadline)
+        per_shot = max((time.perf_counter() - round_start) / count, 1e-6)
+        for result in results:
+            if result["truncated"] == "deadline":
+                continue
+            run += 1
+            scratches += result["scratch"]
+            pots += bool(result["potted"]) and not result["scratch"]
+            for i in result["potted"]:
+                ball_pots[i] += 1
+            density[list(_visited_cells(result["collisions"], origin, cell, shape))] += 1
+
+    cells = [[int(i // shape[1]), int(i % shape[1]), round(float(density[i]) / run, 3)]
+             for i in np.flatnonzero(density)]
+    return {
+        "samples": run,
+        "pot_probability": round(pots / run, 4),
+        "scratch_probability": round(scratches / run, 4),
+        "balls": [{"ball": int(i), "probability": round(float(n) / run, 4)} for i, n in enumerate(ball_pots) if n],
+        "density": {"origin": [float(v) for v in origin], "cell": cell, "shape": list(shape), "cells": cells},
+        "budget_exhausted": run < samples,
+        "elapsed_ms": round((time.perf_counter() - start_time) * 1000.0, 2),
+    }
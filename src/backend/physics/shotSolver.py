@@ -0,0 +1,210 @@
+import math
+import time
+
+import numpy as np
+
+from physics.batchSimulate import build_table_arrays, simulate_batch
+
+SOLVER_SPEEDS = (120.0, 170.0, 220.0, 280.0)
+MAX_CUT_ANGLE = 80.0     # Degrees; thinner cuts than this are not attempted
+COARSE_WINDOW = 6.0      # Degrees either side of each aim line searched in the coarse pass
+COARSE_STEP = 1.0
+FINE_WINDOW = 1.0        # Degrees either side of each coarse hit searched in the fine pass
+FINE_STEP = 0.25
+FALLBACK_STEP = 5.0      # Full-circle step used when every aim line is pruned
+MAX_CANDIDATES = 5
+
+
+def resolve_target(table, target, cue):
+    """
+    Index into the table of the ball to pot.
+
+    Args:
+        table (TableState): Detected balls.
+        target (int | Sequence[int]): A ball index, or a colour matched to the
+            nearest object ball by colour distance.
+        cue (int): Table index of the cue ball, which is never a target.
+
+    Raises:
+        ValueError: If the index is out of range, names the cue ball, or there
+            is no object ball.
+    """
+    if isinstance(target, (list, tuple)):
+        if len(table) < 2:
+            raise ValueError("No object balls on the table")
+        distances = np.linalg.norm(table.colors.astype(np.float64) - np.array(target[:3], dtype=np.float64), axis=1)
+        distances[cue] = np.inf
+        return int(np.argmin(distances))
+
+    index = int(target)
+    if not 0 <= index < len(table):
+        raise ValueError(f"Target ball {index} is out of range")
+    if index == cue:
+        raise ValueError("Target must be an object ball, not the cue ball")
+    return index
+
+
+def ghost_ball(target, pocket, radius):
+    """Where the cue ball's centre must be at contact to send target straight at pocket."""
+    direction = pocket - target
+    return target - 2 * radius * direction / max(np.linalg.norm(direction), 1e-12)
+
+
+def segment_clear(a, b, obstacles, clearance):
+    """
+    True when a ball travelling from a to b passes no obstacle centre closer than clearance.
+    """
+    if len(obstacles) == 0:
+        return True
+    ab = b - a
+    t = np.clip((obstacles - a) @ ab / max(ab @ ab, 1e-12), 0.0, 1.0)
+    closest = a + t[:, None] * ab
+    return bool((np.linalg.norm(obstacles - closest, axis=1) >= clearance).all())
+
+
+def aim_lines(positions, target, cue, pockets, radius, pocket=None):
+    """
+    Cue angles that are geometrically able to pot the target.
+
+    A pocket is pruned when another ball blocks the target's path to it, the
+    cut is thinner than MAX_CUT_ANGLE, or the cue ball cannot reach the ghost
+    ball position without hitting something first.
+
+    Returns:
+        tuple: (list of {"pocket", "angle", "cut"} dicts, number of pockets pruned)
+    """
+    target_pos, cue_pos = positions[target], positions[cue]
+    others = np.delete(positions, [target, cue], axis=0)
+    lines, pruned = [], 0
+    for p in ([pocket] if pocket is not None else range(len(pockets))):
+        ghost = ghost_ball(target_pos, pockets[p], radius)
+        to_pocket = pockets[p] - target_pos
+        to_ghost = ghost - cue_pos
+        cos_cut = to_pocket @ to_ghost / max(np.linalg.norm(to_pocket) * np.linalg.norm(to_ghost), 1e-12)
+        cut = math.degrees(math.acos(float(np.clip(cos_cut, -1.0, 1.0))))
+        if (cut > MAX_CUT_ANGLE
+                or not segment_clear(target_pos, pockets[p], others, 2 * radius)
+                or not segment_clear(cue_pos, ghost, others, 2 * radius)):
+            pruned += 1
+            continue
+        lines.append({
+            "pocket": int(p),
+            "angle": math.degrees(math.atan2(to_ghost[1], to_ghost[0])) % 360.0,
+            "cut": round(cut, 1),
+        })
+    return lines, pruned
+
+
+def _window(center, half_width, step):
+    count = int(round(half_width / step))
+    return [(center + i * step) % 360.0 for i in range(-count, count + 1)]
+
+
+def _pots(result, target, pocket):
+    if result["scratch"] or target not in result["potted"]:
+        return False
+    return pocket is None or result["pockets"][result["potted"].index(target)] == pocket
+
+
+def solve_shot(table, target, pocket=None, speeds=SOLVER_SPEEDS, max_candidates=MAX_CANDIDATES, simulate=None):
+    """
+    Search for cue angles and speeds that pot a chosen ball.
+
+    Aim lines are found geometrically first (ghost ball plus line-of-sight
+    tests), then a coarse pass simulates a window of angles around each one at
+    every speed and a fine pass refines around the angles that potted. If every
+    aim line is pruned the coarse pass falls back to the full circle, since
+    banks and combinations can still work.
+
+    Args:
+        table (TableState): Detected balls, including the cue ball, and rails.
+        target (int | Sequence[int]): Ball to pot, see resolve_target.
+        pocket (int, optional): Index into get_pocket_positions the ball must drop into.
+        speeds (Sequence[float], optional): Cue speeds searched.
+        max_candidates (int, optional): How many shots to return.
+        simulate (callable, optional): Runs a list of (angle, speed) shots and
+            returns simulate_batch results; defaults to simulate_batch in-process.
+
+    Returns:
+        dict: "target", "candidates" (best first, each with angle, speed, pocket
+        and the width in degrees of the window of angles that also pot it),
+        "aim_lines", "pruned", "simulations" and "solve_ms".
+
+    Raises:
+        ValueError: If the target is the cue ball, max_candidates is below 1 or
+            the pocket does not exist.
+    """
+    start_time = time.perf_counter()
+    max_candidates = int(max_candidates)
+    if max_candidates < 1:
+        raise ValueError("max_candidates must be at least 1")
+    positions, _, source_index, _, pockets, radius = build_table_arrays(table)
+    cue = len(positions) - 1
+    target_index = resolve_target(table, target, source_index[cue])
+    if pocket is not None:
+        pocket = int(pocket)
+        if not 0 <= pocket < len(pockets):
+            raise ValueError(f"Pocket {pocket} does not exist")
+    if simulate is None:
+        def simulate(shots):
+            return simulate_batch(table, shots)
+
+    lines, pruned = aim_lines(positions, source_index.index(target_index), cue, pockets, radius, pocket)
+    speeds = [float(s) for s in speeds]
+    simulations = 0
+
+    def run(shots):
+        nonlocal simulations
+        shots = sorted(set((round(angle, 4), speed) for angle, speed in shots))
+        simulations += len(shots)
+        return [r for r in simulate(shots) if _pots(r, target_index, pocket)] if shots else []
+
+    if lines:
+        coarse_angles = [a for line in lines for a in _window(line["angle"], COARSE_WINDOW, COARSE_STEP)]
+    else:
+        coarse_angles = [i * FALLBACK_STEP for i in range(int(360 / FALLBACK_STEP))]
+    coarse_hits = run([(angle, speed) for speed in speeds for angle in coarse_angles])
+
+    # Refine only at the speed each coarse hit was found with
+    hits = run([(angle, hit["speed"]) for hit in coarse_hits
+                for angle in _window(hit["angle"], FINE_WINDOW, FINE_STEP)])
+
+    # A shot that still pots when the angle drifts a little is worth more than a lucky one
+    by_speed = {}
+    for hit in hits:
+        by_speed.setdefault(hit["speed"], set()).add(hit["angle"])
+    candidates = []
+    for hit in hits:
+        angles = by_speed[hit["speed"]]
+        width = 0
+        while round((hit["angle"] - (width + 1) * FINE_STEP) % 360.0, 4) in angles \
+                and round((hit["angle"] + (width + 1) * FINE_STEP) % 360.0, 4) in angles:
+            width += 1
+        candidates.append({
+            "angle": hit["angle"],
+            "speed": hit["speed"],
+            "pocket": hit["pockets"][hit["potted"].index(target_index)],
+            "window": 2 * width * FINE_STEP,
+            "potted": hit["potted"],
+        })
+    candidates.sort(key=lambda c: (-c["window"], c["speed"], c["angle"]))
+
+    best = []
+    for candidate in candidates:
+        # Skip near-copies of a shot already chosen so the list is not the same shot repeated
+        if any(c["pocket"] == candidate["pocket"] and c["speed"] == candidate["speed"]
+               and abs((c["angle"] - candidate["angle"] + 180.0) % 360.0 - 180.0) <= 2 * FINE_WINDOW
+               for c in best):
+            continue
+        best.append(candidate)
+        if len(best) == max_candidates:
+            break
+
+    return {
+        "target": target_index,
+        "candidates": best,
+        "aim_lines": lines,
+        "pruned": pruned,
+        "simulations": simulations,
+        "solve_ms": round((time.perf_counter() - start_time) * 1000.0, 2),
+    }
@@ -0,0 +1,162 @@
+import queue
+import threading
+
+from physics.pathFormat import paths_to_polylines
+from physics.simulatePaths import get_table_space, main, pick_speed
+
+DEFAULT_FPS = 30
+MAX_FPS = 120
+POSITION_SCALE = 10  # Frame coordinates are integers in 1/POSITION_SCALE pixel units
+
+
+class FrameEncoder:
+    """
+    Delta encoding of ball positions. Positions are quantised to integers and
+    each frame only carries the balls whose quantised position changed since
+    the previous frame, as offsets from it, so a client that adds the offsets
+    up reproduces the quantised positions exactly, without drift.
+    """
+
+    def __init__(self, positions, scale=POSITION_SCALE):
+        self.scale = scale
+        self.last = [self.quantise(position) for position in positions]
+        self.on_table = [True] * len(self.last)
+        self.frames = 0
+
+    def quantise(self, position):
+        return [int(round(position[0] * self.scale)), int(round(position[1] * self.scale))]
+
+    def frame(self, balls, sim_time):
+        """
+        The change since the last frame, or None when nothing moved.
+
+        Returns:
+            dict: "t" (simulated seconds), "moves" ([[ball, dx, dy], ...]) and
+            "pocketed" (balls that left the table since the last frame).
+        """
+        moves, pocketed = [], []
+        for i, ball in enumerate(balls):
+            if not self.on_table[i]:
+                continue
+            if ball.body.space is None:
+                self.on_table[i] = False
+                pocketed.append(i)
+                continue
+            x, y = self.quantise(ball.body.position)
+            last = self.last[i]
+            if x != last[0] or y != last[1]:
+                moves.append([i, x - last[0], y - last[1]])
+                last[0], last[1] = x, y
+        if not moves and not pocketed:
+            return None
+        self.frames += 1
+        return {"t": round(sim_time, 4), "moves": moves, "pocketed": pocketed}
+
+
+class ShotStreams:
+    """
+    The shot each session is currently streaming. Starting a new one cancels
+    the previous shot of the same session, so dragging the angle slider never
+    leaves stale simulations holding the table's space.
+    """
+
+    def __init__(self):
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def start(self, session_id):
+        """Register a new shot and return the event that cancels it."""
+        cancel = threading.Event()
+        with self._lock:
+            previous = self._active.get(session_id)
+            if previous is not None:
+                previous.set()
+            self._active[session_id] = cancel
+        return cancel
+
+    def finish(self, session_id, cancel):
+        with self._lock:
+            if self._active.get(session_id) is cancel:
+                del self._active[session_id]
+
+    def active(self):
+        with self._lock:
+            return len(self._active)
+
+
+def stream_shot(table, cue_angle, speed=None, seed=None, fps=DEFAULT_FPS, cancel=None, **limits):
+    """
+    Simulate one shot with the step engine and yield its progress as it runs.
+
+    The simulation runs on its own thread and hands frames over a queue. A
+    frame is taken each time 1/fps of simulated time has passed, so playing
+    the frames back at fps shows the shot in real time. Closing the generator
+    (for instance when the HTTP client disconnects) or setting cancel stops
+    the simulation at its next step.
+
+    Args:
+        table (TableState): Detected balls and rails.
+        cue_angle (float): Cue angle in degrees.
+        speed (float, optional): Cue speed, see pick_speed.
+        fps (int, optional): Frames per simulated second, at most MAX_FPS.
+        cancel (threading.Event, optional): Set to stop the shot early.
+        **limits: Passed to run_game (time_budget, path_tolerance, ...).
+
+    Yields:
+        tuple: (event, payload) pairs: one "start" with the colours and
+        quantised start positions of every ball, "frame" deltas (see
+        FrameEncoder), then "end" with the simplified paths and run stats, or
+        "error".
+    """
+    fps = max(1, min(int(fps), MAX_FPS))
+    speed = pick_speed(speed, seed)
+    cancel = cancel or threading.Event()
+    layout = get_table_space(table).layout()
+    encoder = FrameEncoder([position for _, position in layout])
+    interval = 1.0 / fps
+    next_frame = interval
+    events = queue.Queue()
+
+    def on_step(balls, sim_time, done):
+        nonlocal next_frame
+        if done or sim_time >= next_frame:  # The last frame shows where the balls came to rest
+            next_frame = sim_time + interval
+            frame = encoder.frame(balls, sim_time)
+            if frame is not None:
+                events.put(("frame", frame))
+
+    def run():
+        stats = {}
+        try:
+            segments, cue_ball_pos_start = main(table, cue_angle=cue_angle, show_simulation=False, speed=speed,
+                                                cancel=cancel.is_set, on_step=on_step, stats=stats, **limits)
+            events.put(("end", {
+                "Cue": [int(cue_ball_pos_start[0]), int(cue_ball_pos_start[1])],
+                "steps": stats["steps"],
+                "sim_time": round(stats["sim_time"], 4),
+                "truncated": stats["truncated"],
+                "frames": encoder.frames,
+                "paths": paths_to_polylines(segments),
+            }))
+        except Exception as e:
+            events.put(("error", {"message": str(e)}))
+        finally:
+            events.put(None)
+
+    yield "start", {
+        "fps": fps,
+        "speed": speed,
+        "scale": encoder.scale,
+        "balls": [{"color": list(color), "position": list(position)}
+                  for (color, _), position in zip(layout, encoder.last)],
+    }
+    thread = threading.Thread(target=run, name="shot-stream", daemon=True)
+    thread.start()
+    try:
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            yield event
+    finally:
+        cancel.set()
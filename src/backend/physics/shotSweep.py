@@ -0,0 +1,123 @@
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from TableState import TableState
+from physics.batchSimulate import simulate_batch
+from Metrics import sim_runs, sim_steps, sim_segments
+
+MAX_SWEEP_SHOTS = 20_000
+DEFAULT_SPEED = 200.0
+
+_WARM_TABLE = TableState([(5, 5)], [(255, 255, 255)],
+                         [[(0, 0), (10, 0)], [(0, 10), (10, 10)], [(0, 0), (0, 10)], [(10, 0), (10, 10)]], 1)
+
+
+def _warm_worker():
+    """Run one tiny batch so numpy and the simulator are loaded before real work arrives."""
+    simulate_batch(_WARM_TABLE, [(0.0, 0.0)])
+
+
+def _run_chunk(table, shots, starts=None, deadline=None):
+    return simulate_batch(table, shots, starts=starts, deadline=deadline)
+
+
+def build_shots(angle_start=0.0, angle_end=360.0, angle_step=1.0, speeds=None):
+    """
+    Expand an angle range and a list of speeds into (angle, speed) pairs.
+
+    Raises:
+        ValueError: If the step is not positive or the sweep is too large.
+    """
+    angle_start, angle_end, angle_step = float(angle_start), float(angle_end), float(angle_step)
+    if not all(math.isfinite(v) for v in (angle_start, angle_end, angle_step)):
+        raise ValueError("Sweep angles must be finite")
+    if angle_step <= 0:
+        raise ValueError("angle_step must be positive")
+    speeds = [float(s) for s in (speeds or [DEFAULT_SPEED])]
+
+    # Size the sweep before building it, so an oversized range is rejected without allocating it
+    count = max(0, math.ceil((angle_end - angle_start) / angle_step))
+    if count * len(speeds) > MAX_SWEEP_SHOTS:
+        raise ValueError(f"Sweep would run more than {MAX_SWEEP_SHOTS} shots")
+    angles = [a for a in (angle_start + k * angle_step for k in range(count)) if a < angle_end]
+    return [(a, s) for s in speeds for a in angles]
+
+
+def rank_results(results):
+    """
+    Order shots by object balls potted (most first), then no cue scratch.
+
+    Returns:
+        List[dict]: angle, speed, potted count and scratch flag, best shot first.
+    """
+    ranking = []
+    for result in results:
+        ranking.append({
+            "angle": result["angle"],
+            "speed": result["speed"],
+            "potted": len(result["potted"]) - int(result["scratch"]),
+            "scratch": result["scratch"],
+        })
+    ranking.sort(key=lambda r: (-r["potted"], r["scratch"], r["angle"]))
+    return ranking
+
+
+class SweepPool:
+    """
+    Process pool of pre-warmed simulation workers shared by every session.
+
+    Table states are a few balls and four rails, so each chunk carries the
+    table it belongs to; any worker can serve any session and the pool never
+    has to restart when a different table is swept.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+        return self._executor
+
+    def warm(self):
+        """Spawn every worker now (running its warm-up) instead of on the first sweep."""
+        executor = self.start()
+        for future in [executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def sweep(self, shots, table, starts=None, deadline=None):
+        """
+        Simulate every shot on the given table across the pool. starts, if
+        given, holds per-shot ball positions, and deadline stops every chunk at
+        that time.time(), as in simulate_batch.
+
+        Returns:
+            List[dict]: simulate_batch results, in the same order as shots.
+        """
+        executor = self.start()
+        chunk = max(1, -(-len(shots) // (self.workers * 2)))
+        chunks = [shots[i:i + chunk] for i in range(0, len(shots), chunk)]
+        results = []
+        if starts is None:
+            start_chunks = [None] * len(chunks)
+        else:
+            start_chunks = [starts[i:i + chunk] for i in range(0, len(shots), chunk)]
+        for part in executor.map(_run_chunk, [table] * len(chunks), chunks, start_chunks, [deadline] * len(chunks)):
+            results.extend(part)
+
+        # Workers have their own registries, so count here where /metrics can see it
+        sim_runs.inc(len(results), engine="batch")
+        sim_steps.inc(sum(r["steps"] for r in results), engine="batch")
+        sim_segments.inc(sum(len(r["collisions"]) for r in results), engine="batch")
+        return results
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -1,17 +1,13 @@
-import sys
 import math
 import random
-import pygame
 import pymunk
-import svgwrite
-import io
-import tempfile
-import tracemalloc
+import threading
+import time
+from collections import OrderedDict
 
-
-collisions = []
-last_positions = {}
-import gc
+from physics.pathFormat import segments_to_array, paths_to_svg
+from physics.pathRecorder import PathRecorder, DEFAULT_TOLERANCE
+from Metrics import timed, sim_runs, sim_steps, sim_segments
 
 
 def calculate_deceleration(velocity, friction_coefficient, delta_time):
@@ -101,7 +97,7 @@ def on_collision_ball_pocket(arbiter, space, data):
     return False  # End collision processing
 
 class SimulatedBall:
-    def __init__(self, x, y, radius, color, space, velocity=(0, 0)):
+    def __init__(self, x, y, radius, color, space, velocity=(0, 0), positions=None):
         self.radius = radius
         self.color = color
 
@@ -117,38 +113,19 @@ class SimulatedBall:
 
         space.add(self.body, self.shape)
 
-        last_positions[self.shape] = (x, y)
+        if positions is not None:
+            positions[self.shape] = (x, y)
 
     def draw(self, screen):
+        import pygame  # Only needed when a simulation is shown on screen
+
         pos = self.body.position
         pygame.draw.circle(screen, self.color, (int(pos.x), int(pos.y)), self.radius)
 
 
 def save_paths_as_svg(collisions, WIDTH, HEIGHT):
-    # Create a temporary file to store the SVG content
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.svg')
-
-    # Create the SVG drawing and write directly to the temporary file
-    dwg = svgwrite.Drawing(temp_file.name, profile='tiny', size=(str(WIDTH), str(HEIGHT)))
-    
-    # Add the background rectangle (pool table green)
-    # dwg.add(dwg.rect(insert=(0, 0), size=(str(WIDTH), str(HEIGHT)), fill='rgb(38, 141, 44)'))
-    
-    # Add the collision lines
-    for start, end, color in collisions:
-        svg_color = f'rgb({color[0]},{color[1]},{color[2]})'
-        dwg.add(dwg.line(
-            start=(str(start[0]), str(start[1])),
-            end=(str(end[0]), str(end[1])),
-            stroke=svg_color,
-            stroke_width=2
-        ))
-    
-    # Save the SVG content directly to the temporary file
-    dwg.save()
-
-    # Return the path to the temporary file
-    return temp_file.name
+    """Render recorded (start, end, color) segments as an SVG string."""
+    return paths_to_svg(segments_to_array(collisions), WIDTH, HEIGHT)
 
     
 def create_borders(edges, space):
@@ -165,10 +142,11 @@ def create_borders(edges, space):
         wall.collision_type = 2
         space.add(wall)
 
-def create_pockets(WIDTH, HEIGHT, space):
-    """Create 6 pockets for the pool table with visual outlines."""
-    pocket_radius = 20
-    pocket_positions = [
+POCKET_RADIUS = 20
+
+def get_pocket_positions(WIDTH, HEIGHT):
+    """Centres of the 6 pockets for a table of the given size."""
+    return [
         (10, 10),  
         (10, (WIDTH // 2)+200), 
         (WIDTH - 10, 10), 
@@ -177,6 +155,11 @@ def create_pockets(WIDTH, HEIGHT, space):
         (WIDTH - 10, HEIGHT - 10)  
     ]
 
+def create_pockets(WIDTH, HEIGHT, space):
+    """Create 6 pockets for the pool table with visual outlines."""
+    pocket_radius = POCKET_RADIUS
+    pocket_positions = get_pocket_positions(WIDTH, HEIGHT)
+
     pockets = []
     for pos in pocket_positions:
         pocket_body = pymunk.Body(body_type=pymunk.Body.STATIC)
@@ -189,63 +172,131 @@ def create_pockets(WIDTH, HEIGHT, space):
     return pockets
 
 def draw_pockets(screen, pockets):
-    
+    import pygame  # Only needed when a simulation is shown on screen
+
     for pos, radius in pockets:
         pygame.draw.circle(screen, (255, 255, 255), (int(pos[0]), int(pos[1])), radius, 2)  # White outline
 
-def get_cue_ball(pool_balls, max_color_diff=100):
-    def color_distance(color1, color2):
-        # Euclidean distance between two colors in RGB space
-        return math.sqrt((color1[0] - color2[0]) ** 2 + (color1[1] - color2[1]) ** 2 + (color1[2] - color2[2]) ** 2)
+def get_table_size(wall_cords):
+    """Width and height of the table spanned by the top and left rails."""
+    top_edge = wall_cords[0]
+    left_edge = wall_cords[2]
+    WIDTH = top_edge[1][0] - top_edge[0][0]
+    HEIGHT = left_edge[1][1] - left_edge[0][1]
+    return WIDTH, HEIGHT
+
+def split_cue_ball(table):
+    """
+    Index of the cue ball (see TableState.cue_index) and the indices of every
+    other ball, in table order.
 
-    remaining_balls = []
-    closest_ball = None
-    closest_color_diff = float('inf') 
+    Raises:
+        ValueError: If no ball is white enough to be the cue ball.
+    """
+    cue = table.cue_index()
+    if cue is None:
+        raise ValueError("Cue ball is required for the simulation")
+    return cue, [i for i in range(len(table)) if i != cue]
 
-    for ball in pool_balls:        
-        color_diff = color_distance(ball.color, (255, 255, 255))
+# Limits that keep a single shot from holding a worker indefinitely
+REST_VELOCITY_EPSILON = 0.5  # Speeds below this are treated as at rest
+MIN_TIME_STEP = 1 / 500.0
+MAX_TIME_STEP = 1 / 20.0
+MAX_TRAVEL_PER_STEP = 0.5  # Fraction of a ball radius any ball may move in one step
+MAX_STEPS = 5_000
+TIME_BUDGET = 2.0  # Wall-clock seconds per shot
 
-        # If the ball is closer to white and within the color difference threshold, keep it
-        if color_diff < closest_color_diff and color_diff <= max_color_diff:
-            closest_color_diff = color_diff
-            if closest_ball:
-                remaining_balls.append(closest_ball)
-            closest_ball = ball
-        else:
-            remaining_balls.append(ball)
 
-    return closest_ball, remaining_balls
+def choose_time_step(max_speed, ball_radius):
+    """Largest step that keeps the fastest ball within MAX_TRAVEL_PER_STEP radii."""
+    if max_speed <= 0:
+        return MAX_TIME_STEP
+    dt = MAX_TRAVEL_PER_STEP * ball_radius / max_speed
+    return min(MAX_TIME_STEP, max(MIN_TIME_STEP, dt))
 
-def run_game(balls, screen, clock, pockets, show_simulation, WIDTH, HEIGHT, space):
-    running = True
+
+def run_game(balls, screen, clock, pockets, show_simulation, WIDTH, HEIGHT, space, collisions=None,
+             rest_epsilon=REST_VELOCITY_EPSILON, max_steps=MAX_STEPS, time_budget=TIME_BUDGET,
+             cancel=None, stats=None, recorder=None, path_tolerance=DEFAULT_TOLERANCE, max_path_points=None,
+             on_step=None):
+    """
+    Step the space until every ball is at rest or a limit is hit.
+
+    Args:
+        recorder (PathRecorder, optional): Records every ball's position after
+            each step; the returned segments are then its simplified
+            trajectories instead of the collision-to-collision segments.
+        path_tolerance (float): Simplification error bound in pixels, see
+            pathRecorder.simplify.
+        max_path_points (int, optional): Cap on points per ball path.
+        rest_epsilon (float): Speed below which a ball is stopped outright.
+        max_steps (int): Hard cap on physics steps.
+        time_budget (float): Hard cap on wall-clock seconds.
+        cancel (callable, optional): Polled every step; returning True stops the shot.
+        on_step (callable, optional): Called after every step with (balls,
+            simulated seconds so far, False) and once more with True when the
+            shot stops, e.g. to stream positions as they change.
+        stats (dict, optional): Filled with "steps", "sim_time", "truncated"
+            (None, "max_steps", "time_budget" or "cancelled") and "segments"
+            (recorded before simplification).
+
+    Returns:
+        numpy.ndarray: (N, 7) float32 segments recorded so far.
+    """
+    if collisions is None:
+        collisions = []
     friction_coefficient = 0.7  #
 
     cue_ball = next((b for b in balls if b.color == (255, 255, 255)), None)
     if not cue_ball:
         raise ValueError("Cue ball is required for the simulation")
 
-    while running:
-        still_moving = any(abs(ball.body.velocity[0]) > 0 or abs(ball.body.velocity[1]) > 0 for ball in balls)
-        if not still_moving:
-            print("All balls have stopped")
+    ball_radius = cue_ball.radius
+    deadline = time.perf_counter() + time_budget
+    truncated = None
+    steps = 0
+    sim_time = 0.0
+
+    while True:
+        max_speed = 0.0
+        moving = []
+        for i, ball in enumerate(balls):
+            speed = ball.body.velocity.length
+            if speed < rest_epsilon:
+                if speed > 0:
+                    ball.body.velocity = (0, 0)
+            else:
+                moving.append(i)
+                if speed > max_speed:
+                    max_speed = speed
+        if max_speed == 0.0:
             break
 
-        # Apply velocity to the cue ball in the direction of the provided angle when stationary
-        # if cue_ball.body.velocity.length == 0 and cue_angle is not None:
-        #     speed = 200  # Set the desired speed of the cue ball
-        #     cue_ball.body.velocity = (
-        #         speed * math.cos(cue_angle),
-        #         speed * math.sin(cue_angle)
-        #     )
+        if steps >= max_steps:
+            truncated = "max_steps"
+            break
+        if time.perf_counter() > deadline:
+            truncated = "time_budget"
+            break
+        if cancel is not None and cancel():
+            truncated = "cancelled"
+            break
 
+        dt = choose_time_step(max_speed, ball_radius)
         for ball in balls:
             velocity = ball.body.velocity
-            ball.body.velocity = calculate_deceleration((velocity.x, velocity.y), friction_coefficient, 1/50.0)
-
-        if show_simulation:
-            space.step(1/50.0)
-        else:
-            space.step(1/50.0)
+            ball.body.velocity = calculate_deceleration((velocity.x, velocity.y), friction_coefficient, dt)
+
+        space.step(dt)
+        steps += 1
+        sim_time += dt
+        if recorder is not None:
+            for i in moving:
+                body = balls[i].body
+                if body.space is not None:  # Pocketed balls have been removed from the space
+                    recorder.record(i, body.position)
+        if on_step is not None:
+            on_step(balls, sim_time, False)
 
         # screen.fill((38, 141, 44))
 
@@ -255,129 +306,184 @@ def run_game(balls, screen, clock, pockets, show_simulation, WIDTH, HEIGHT, spac
         #     if b.body in space.bodies:
         #         b.draw(screen)
 
-        for line_seg in collisions:
-            start, end, color = line_seg
-            # pygame.draw.line(screen, color,
-            #                  (int(start[0]), int(start[1])),
-            #                  (int(end[0]), int(end[1])),
-            #                  2)
-
         # pygame.display.flip()
         # if show_simulation:
         #     clock.tick(50)
         # else:
         #    clock.tick(100_000) 
 
-    # Save the collisions as an SVG when the simulation ends
-    tempfile_svg_name = save_paths_as_svg(collisions, WIDTH, HEIGHT)
-    print("SAVED SVG")
-    
-    pygame.quit()
-        
-    return tempfile_svg_name 
-
-
-# Add this modification to save the paths to an SVG file whenever the simulation ends.
-# The saved SVG can then be embedded into a website using standard HTML <img> tags or <object> tags.
+    if on_step is not None:
+        on_step(balls, sim_time, True)
 
+    # Hand the recorded paths back as an array; callers serialize at the edge
+    if recorder is not None:
+        segments = recorder.to_segments(path_tolerance, max_path_points)
+        recorded = recorder.recorded_segments()
+    else:
+        segments = segments_to_array(collisions)
+        recorded = len(segments)
+    if stats is not None:
+        stats.update({"steps": steps, "sim_time": sim_time, "truncated": truncated, "segments": recorded})
+    return segments
 
-def cleanup_space(space, balls):
-    for ball in balls:
-        if ball.body in space.bodies:
-            print(f"Removing ball: {ball.shape}")
-            space.remove(ball.body, ball.shape)
-
-    print("Clearing collisions and handlers")
-    collisions.clear()
-    last_positions.clear()
-
-    # # Remove collision handlers
-    # space.remove_collision_handler(1, 1)
-    # space.remove_collision_handler(1, 2)
-    # space.remove_collision_handler(1, 3)
-
-    print("Remaining bodies:", len(space.bodies))
-    print("Remaining shapes:", len(space.shapes))
-
-
-def main(pool_balls, wall_cords=None, ball_radius=15, cue_angle=0, show_simulation=True):
-    global collisions, last_positions
-    
-    space = pymunk.Space()
-    space.gravity = (0, 0)
-
-    collisions = []
-    last_positions = {}
 
-    # pygame.init()
-    
-    top_edge = wall_cords[0]
-    left_edge = wall_cords[2]
-    WIDTH = top_edge[1][0] - top_edge[0][0]
-    HEIGHT = left_edge[1][1] - left_edge[0][1]
-    
-    # screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    # clock = pygame.time.Clock()
+def run_event_shot(table, cue_angle, speed, stats=None):
+    """Run one shot with the event-driven engine and return its paths like run_game does."""
+    from physics.eventSimulate import simulate_events
 
-    create_borders(wall_cords, space)
+    cue, _ = split_cue_ball(table)
+    result = simulate_events(table, cue_angle=cue_angle, speed=speed)
+    if stats is not None:
+        stats.update({"steps": result["events"], "sim_time": result["duration"], "truncated": result["truncated"]})
+    return segments_to_array(result["collisions"]), tuple(table.positions[cue])
 
-    handler_bb = space.add_collision_handler(1, 1)
-    handler_bb.begin = on_collision_ball_ball
-    handler_bb.data["collisions"] = collisions
-    handler_bb.data["last_positions"] = last_positions
 
-    handler_bw = space.add_collision_handler(1, 2)
-    handler_bw.begin = on_collision_ball_wall
-    handler_bw.data["collisions"] = collisions
-    handler_bw.data["last_positions"] = last_positions
+class TableSpace:
+    """
+    A pymunk space for one table layout, built once and reused for every shot.
 
-    handler_bp = space.add_collision_handler(1, 3)  
-    handler_bp.begin = on_collision_ball_pocket
+    The walls, pockets, balls and collision handlers are created in __init__;
+    run_shot() only restores the balls to the snapshot taken at construction
+    time and gives the cue ball its velocity.
+    """
 
-    cue_ball, remaining_balls = get_cue_ball(pool_balls)
-    pool_balls = remaining_balls
-    cue_ball_pos_start = (cue_ball.x_cord, cue_ball.y_cord )
+    def __init__(self, table):
+        self.space = pymunk.Space()
+        self.space.gravity = (0, 0)
+        self.collisions = []
+        self.last_positions = {}
+        self.lock = threading.Lock()
+
+        self.WIDTH, self.HEIGHT = table.table_size
+        create_borders(table.edges, self.space)
+
+        handler_bb = self.space.add_collision_handler(1, 1)
+        handler_bb.begin = on_collision_ball_ball
+        handler_bb.data["collisions"] = self.collisions
+        handler_bb.data["last_positions"] = self.last_positions
+
+        handler_bw = self.space.add_collision_handler(1, 2)
+        handler_bw.begin = on_collision_ball_wall
+        handler_bw.data["collisions"] = self.collisions
+        handler_bw.data["last_positions"] = self.last_positions
+
+        handler_bp = self.space.add_collision_handler(1, 3)
+        handler_bp.begin = on_collision_ball_pocket
+
+        cue, remaining = split_cue_ball(table)
+        positions = table.positions.tolist()
+        self.cue_ball_pos_start = tuple(positions[cue])
+
+        self.balls = []
+        for i in remaining:
+            ball = SimulatedBall(*positions[i], table.radius, tuple(int(c) for c in table.colors[i]), self.space,
+                                 velocity=(0, 0), positions=self.last_positions)
+            self.balls.append(ball)
+        self.cue = SimulatedBall(*positions[cue], table.radius, (255, 255, 255),
+                                 self.space, velocity=(0, 0), positions=self.last_positions)
+        self.balls.append(self.cue)
+
+        self.pockets = create_pockets(self.WIDTH, self.HEIGHT, self.space)
+        self.recorder = PathRecorder([ball.color for ball in self.balls])
+        self._snapshot = self.snapshot()
+
+    def layout(self):
+        """(color, start position) of every ball, in the order run_game steps them (cue ball last)."""
+        return [(ball.color, position) for ball, position, _ in self._snapshot]
+
+    def snapshot(self):
+        """Current position and velocity of every ball."""
+        return [(ball, tuple(ball.body.position), tuple(ball.body.velocity)) for ball in self.balls]
+
+    def restore(self, snapshot=None):
+        """
+        Put every ball back to a snapshot (the initial layout by default).
+
+        Balls are removed and re-added so pymunk forgets their cached contacts
+        and fires begin callbacks again on the next shot; pocketed balls return.
+        """
+        for ball, position, velocity in snapshot or self._snapshot:
+            if ball.body in self.space.bodies:
+                self.space.remove(ball.body, ball.shape)
+            ball.body.position = position
+            ball.body.velocity = velocity
+            ball.body.angular_velocity = 0
+            ball.body.angle = 0
+            self.space.add(ball.body, ball.shape)
+
+        self.collisions.clear()
+        self.last_positions.clear()
+        for ball in self.balls:
+            self.last_positions[ball.shape] = tuple(ball.body.position)
+
+    def run_shot(self, cue_angle, speed, show_simulation=False, **limits):
+        """
+        Simulate one shot from the snapshot layout, recording every ball's full
+        trajectory. Extra keyword arguments (rest_epsilon, max_steps,
+        time_budget, cancel, stats, path_tolerance, max_path_points, on_step)
+        go to run_game.
+
+        Returns:
+            numpy.ndarray: (N, 7) float32 segments, see physics.pathFormat.
+        """
+        with self.lock:
+            self.restore()
+            self.cue.body.velocity = pymunk.Vec2d(speed, 0).rotated(math.radians(cue_angle))
+            self.recorder.reset([tuple(ball.body.position) for ball in self.balls])
+            return run_game(self.balls, None, None, self.pockets, show_simulation,
+                            self.WIDTH, self.HEIGHT, self.space, collisions=self.collisions,
+                            recorder=self.recorder, **limits)
+
+
+MAX_TABLE_SPACES = 8
+_table_spaces = OrderedDict()
+_table_spaces_lock = threading.Lock()
+
+
+def get_table_space(table):
+    """Return the cached TableSpace for this TableState, building it on first use."""
+    key = table.key
+    with _table_spaces_lock:
+        space = _table_spaces.get(key)
+        if space is None:
+            space = TableSpace(table)
+            _table_spaces[key] = space
+            while len(_table_spaces) > MAX_TABLE_SPACES:
+                _table_spaces.popitem(last=False)
+        _table_spaces.move_to_end(key)
+    return space
+
+
+def pick_speed(speed=None, seed=None):
+    """
+    Cue ball speed for a shot: the explicit speed if given, otherwise drawn
+    from [150, 220], reproducibly when a seed is given.
+    """
+    if speed is not None:
+        return float(speed)
+    rng = random.Random(seed) if seed is not None else random
+    return rng.uniform(150, 220)
 
-    balls = []
-    for pb in pool_balls:
-        x = pb.x_cord
-        y = pb.y_cord
-        color = pb.color
 
-        ball = SimulatedBall(x, y, int(ball_radius), color, space, velocity=(0,0))
-        balls.append(ball)
+def main(table, cue_angle=0, show_simulation=True, engine="step", speed=None, seed=None, **limits):
+    if table.edges is None:
+        raise ValueError("Wall coordinates must be provided.")
+    if engine not in ("step", "event"):
+        raise ValueError(f"Unknown simulation engine: {engine}")
 
     # Random cue ball velocity if not specified
-    speed = random.uniform(150, 220)
-    vx, vy = pymunk.Vec2d(speed, 0).rotated(math.radians(cue_angle))
-    
-    cue = SimulatedBall(
-        cue_ball.x_cord, 
-        cue_ball.y_cord, 
-        int(ball_radius), 
-        (255, 255, 255), 
-        space,
-        pymunk.Vec2d(vx, vy)
-    )
-    balls.append(cue)
-
-    pockets = create_pockets(WIDTH, HEIGHT, space)
-
-    screen = None
-    clock = None
-    tempfile_svg_name = run_game(balls, screen, clock, pockets, show_simulation, WIDTH, HEIGHT, space)
-    
-    # At the end of the game
-    cleanup_space(space, balls)
-    gc.collect()
-    pygame.display.quit()
-    pygame.quit()
-    del space
-    
-    # snapshot = tracemalloc.take_snapshot()
-    # top_stats = snapshot.statistics('lineno')
-    # print("[Top 10 memory-consuming lines]")
-    # for index, stat in enumerate(top_stats[:10], 1):
-    #     print(f"#{index}: {stat}")  # Get memory stats before and after cleanup
+    speed = pick_speed(speed, seed)
+    stats = limits.setdefault("stats", {})
 
-    return tempfile_svg_name, cue_ball_pos_start
+    with timed("simulate"):
+        if engine == "event":
+            segments, cue_ball_pos_start = run_event_shot(table, cue_angle, speed, stats=stats)
+        else:
+            space = get_table_space(table)
+            segments = space.run_shot(cue_angle, speed, show_simulation, **limits)
+            cue_ball_pos_start = space.cue_ball_pos_start
+
+    sim_runs.inc(engine=engine)
+    sim_steps.inc(stats.get("steps", 0), engine=engine)
+    sim_segments.inc(stats.get("segments", len(segments)), engine=engine)
+    return segments, cue_ball_pos_start
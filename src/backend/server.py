@@ -1,14 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
+import io
 import os
+import json
 import base64
-from io import BytesIO
-from PIL import Image
 from flask_cors import CORS
-import numpy as np
-import cv2
 from main import getCueTips
-from physics.simulatePaths import main
-import pygame
+from physics.simulatePaths import main, TIME_BUDGET
+from physics.pathFormat import PATH_FORMATS, serialize_paths, paths_to_polylines, segments_to_array
+from physics.pathRecorder import DEFAULT_TOLERANCE
+from physics.shotSweep import DEFAULT_SPEED, SweepPool, build_shots, rank_results
+from physics.shotSolver import SOLVER_SPEEDS, solve_shot
+from physics.shotRobustness import BATCH_SIZE, DEFAULT_SAMPLES, TIME_BUDGET as ROBUSTNESS_BUDGET, estimate_robustness
+from physics.shotCache import ShotCache, shot_key
+from physics.shotStream import DEFAULT_FPS, ShotStreams, stream_shot
+from TableCache import cache_from_env
+from Calibration import CalibrationStore
+from BallTracker import BallTracker
+from LiveStream import LiveStreamManager, read_frames, sse_events
+from ImageIO import IMAGE_FORMATS, DEFAULT_QUALITY, decode_image, encode_image, frame_buffers
+from Scene import SCENE_OUTPUTS, describe_table
+from JobQueue import JobQueue, QueueFullError, upload_job, warm_cv_worker
+from Metrics import registry, request_seconds, timed
+from Warmup import warm_up
+from BatchPipeline import BatchRunner, list_images, table_to_json
+import time
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -16,63 +31,583 @@ CORS(app)  # Enable CORS for all routes
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-sim_env_data = None  # Global state for simulation (not ideal for production)
+table_cache = cache_from_env()  # Parsed table state per session
+sweep_pool = SweepPool()
+shot_cache = ShotCache()
+shot_streams = ShotStreams()
+calibration_store = CalibrationStore(os.environ.get('CUETIPS_CALIBRATION_DIR', 'calibration'))
+stream_calibration = CalibrationStore()  # Memory-only profiles for live streams that name no camera
+batch_runner = BatchRunner(int(os.environ.get('CUETIPS_BATCH_WORKERS', 0)) or None)
+BATCH_ROOT = os.environ.get('CUETIPS_BATCH_ROOT')  # Server-side directories /upload/batch may read from
+
+
+def store_job_table(job):
+    """Move a finished upload job's table state into the session cache."""
+    job["result"] = dict(job["result"])
+    table_cache.put(job["meta"]["session_id"], job["result"].pop("table"))
+
+
+upload_jobs = JobQueue(upload_job, workers=int(os.environ.get('CUETIPS_JOB_WORKERS', 0)) or None,
+                       max_pending=int(os.environ.get('CUETIPS_JOB_QUEUE', 32)),
+                       initializer=warm_cv_worker, on_done=store_job_table)
+
+
+def collect_service_metrics():
+    """Cache, job queue and buffer pool figures, read from their own counters at scrape time."""
+    shot, jobs, buffers = shot_cache.stats(), upload_jobs.stats(), frame_buffers.stats()
+    return [
+        ("cuetips_cache_lookups_total", "counter", "Cache lookups by cache and result.", [
+            ("cuetips_cache_lookups_total", '{cache="shot",result="hit"}', shot["hits"]),
+            ("cuetips_cache_lookups_total", '{cache="shot",result="miss"}', shot["misses"]),
+            ("cuetips_cache_lookups_total", '{cache="table",result="hit"}', table_cache.hits),
+            ("cuetips_cache_lookups_total", '{cache="table",result="miss"}', table_cache.misses),
+        ]),
+        ("cuetips_shot_cache_entries", "gauge", "Simulations held in the shot cache.", [
+            ("cuetips_shot_cache_entries", "", shot["entries"]),
+        ]),
+        ("cuetips_job_queue_depth", "gauge", "Upload jobs waiting for a worker.", [
+            ("cuetips_job_queue_depth", "", jobs["queue_depth"]),
+        ]),
+        ("cuetips_jobs_total", "counter", "Upload jobs by outcome.", [
+            ("cuetips_jobs_total", '{outcome="completed"}', jobs["completed"]),
+            ("cuetips_jobs_total", '{outcome="failed"}', jobs["failed"]),
+            ("cuetips_jobs_total", '{outcome="rejected"}', jobs["rejected"]),
+        ]),
+        ("cuetips_frame_buffers_total", "counter", "Pooled frame buffer requests by outcome.", [
+            ("cuetips_frame_buffers_total", '{outcome="allocated"}', buffers["allocations"]),
+            ("cuetips_frame_buffers_total", '{outcome="reused"}', buffers["reuses"]),
+        ]),
+        ("cuetips_frame_buffer_idle_bytes", "gauge", "Bytes held by idle pooled frame buffers.", [
+            ("cuetips_frame_buffer_idle_bytes", "", buffers["idle_bytes"]),
+        ]),
+    ]
+
+
+registry.add_collector(collect_service_metrics)
+
+
+def preload():
+    """
+    Warm OpenCV and the physics engines in this process and spawn the sweep and
+    upload worker pools, so the first requests don't pay any cold-start cost.
+    Runs at import when CUETIPS_PRELOAD is set (e.g. once per gunicorn worker).
+    """
+    timings = warm_up()
+    start = time.perf_counter()
+    sweep_pool.warm()
+    upload_jobs.warm()
+    timings["pools"] = time.perf_counter() - start
+    return timings
+
+
+if os.environ.get('CUETIPS_PRELOAD', '').lower() in ('1', 'true', 'yes'):
+    preload()
+
+
+@app.before_request
+def start_request_timer():
+    request.environ['cuetips.start'] = time.perf_counter()
+
+
+@app.after_request
+def observe_request(response):
+    start = request.environ.get('cuetips.start')
+    if start is not None and request.url_rule is not None:
+        request_seconds.observe(time.perf_counter() - start, endpoint=request.url_rule.rule,
+                                method=request.method, status=response.status_code)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of stage timings, simulation counters and cache/queue state."""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def get_session_id(request_data=None):
+    """Session id from the X-Session-ID header, the JSON body or the upload form."""
+    session_id = request.headers.get('X-Session-ID')
+    if not session_id and request_data:
+        session_id = request_data.get('session_id')
+    if not session_id:
+        session_id = request.form.get('session_id')
+    return session_id
+
+
+def parse_pyramid(value):
+    value = (value or 'auto').lower()
+    return value if value == 'auto' else value in ('1', 'true', 'yes')
+
+
+def detach_upload(file):
+    """
+    Take an uploaded file's spooled stream away from the request, which closes
+    its files as soon as the view returns, and return a callable that reads and
+    closes it later (e.g. from a streamed response).
+    """
+    stream, file.stream = file.stream, io.BytesIO()
+
+    def read():
+        with stream:
+            return stream.read()
+    return read
+
+
+def valid_seed(seed):
+    """Seeds go to random.Random, which only takes None, ints (not bools) and strings here."""
+    return seed is None or (isinstance(seed, (int, str)) and not isinstance(seed, bool))
+
 
 @app.route('/upload', methods=['POST'])
 def upload_image():
-    global sim_env_data
+    """
+    Parse a table photo (multipart "file" or a raw JPEG/PNG/WebP body).
+
+    output=scene (default) returns the table as JSON data (bounds, pockets,
+    balls) and output=svg the same scene as an SVG string, both without
+    rasterising anything. output=raster draws the cartoon table: JSON with a
+    base64 PNG, or with format=png|jpeg|webp|raw the image bytes directly (raw
+    is BGR pixels with X-Image-Width/Height headers); add base64=1 to get those
+    wrapped in JSON instead. quality sets JPEG/WebP quality.
+    """
     try:
         file = request.files.get('file')
-        if not file or file.filename == '':
+        if file is not None and file.filename == '':
+            return jsonify({"message": "No selected file"}), 400
+        data = file.read() if file is not None else request.get_data()
+        if not data:
             return jsonify({"message": "No selected file"}), 400
 
-        img = Image.open(file.stream)
-        img = np.array(img)
+        fmt = request.values.get('format')
+        output = request.values.get('output', 'raster' if fmt else 'scene').lower()
+        if output not in SCENE_OUTPUTS:
+            return jsonify({"message": f"output must be one of {', '.join(SCENE_OUTPUTS)}"}), 400
+        as_base64 = fmt is None or request.values.get('base64', '').lower() in ('1', 'true', 'yes')
+        fmt = (fmt or 'png').lower()
+        if fmt not in IMAGE_FORMATS:
+            return jsonify({"message": f"format must be one of {', '.join(IMAGE_FORMATS)}"}), 400
+        quality = int(request.values.get('quality', DEFAULT_QUALITY))
 
-        # Test image - make sure this file exists
-        test_img_path = "/Users/jacobleader/Desktop/Code/CueTips/data/pool_table_overhead.png"
-        if not os.path.exists(test_img_path):
-            return jsonify({"message": f"Test image not found at {test_img_path}"}), 500
+        pyramid = parse_pyramid(request.values.get('pyramid'))
+        camera_id = request.values.get('camera_id')
+        with frame_buffers.lease():
+            img = decode_image(data)
+            table_graphic, _, cue_ball_cords, sim_env_data = getCueTips(img, run_sim=False, pyramid=pyramid,
+                                                                        camera_id=camera_id,
+                                                                        calibration=calibration_store,
+                                                                        render=output == 'raster')
+        session_id = get_session_id() or table_cache.new_session_id()
+        table_cache.put(session_id, sim_env_data)
 
-        img = cv2.imread(test_img_path)
-        table_graphic, _, cue_ball_cords, sim_env_data = getCueTips(img, run_sim=False)
+        if output != 'raster':
+            with timed("serialize"):
+                scene = describe_table(sim_env_data, output)
+            return jsonify({output: scene, "session_id": session_id}), 200
 
-        img_rgb = cv2.cvtColor(table_graphic, cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(img_rgb)
-        buffered = BytesIO()
-        pil_img.save(buffered, format="PNG")
-        img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+        with timed("serialize"):
+            body, mimetype = encode_image(table_graphic, fmt, quality)
+        if as_base64:
+            return jsonify({"image": base64.b64encode(body).decode('utf-8'), "format": fmt,
+                            "session_id": session_id}), 200
 
-        return jsonify({"image": img_base64}), 200
+        headers = {"X-Session-ID": session_id}
+        if fmt == 'raw':
+            headers.update({"X-Image-Width": str(table_graphic.shape[1]),
+                            "X-Image-Height": str(table_graphic.shape[0])})
+        return Response(body, mimetype=mimetype, headers=headers), 200
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         return jsonify({"message": f"Error uploading image: {str(e)}"}), 500
 
 
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    Analyse many table images across the batch process pool and stream one
+    JSON line per image (balls, edges, radius) as each finishes, then a
+    summary line with images/sec. Images come as repeated multipart "file"
+    fields, or as {"directory": ...} / {"paths": [...]} under CUETIPS_BATCH_ROOT.
+    """
+    pyramid = parse_pyramid(request.values.get('pyramid'))
+    files = request.files.getlist('file')
+    if files:
+        # Read each upload only as it is submitted, so at most max_in_flight images sit in memory
+        items = [(f.filename or f"image-{i}", detach_upload(f)) for i, f in enumerate(files)]
+    else:
+        request_data = request.get_json(silent=True) or {}
+        sources = request_data.get('paths') or ([request_data['directory']] if request_data.get('directory') else [])
+        if not sources:
+            return jsonify({"message": "Send image files, or a directory or paths under CUETIPS_BATCH_ROOT"}), 400
+        if not BATCH_ROOT:
+            return jsonify({"message": "Server-side batches are disabled; set CUETIPS_BATCH_ROOT"}), 403
+        root = os.path.realpath(BATCH_ROOT)
+        paths = [os.path.realpath(os.path.join(root, source)) for source in sources]
+        if any(os.path.commonpath([root, path]) != root for path in paths):
+            return jsonify({"message": "Paths must be inside CUETIPS_BATCH_ROOT"}), 403
+        items = [(path, None) for path in list_images(paths)]
+
+    def generate():
+        for result in batch_runner.run(items, pyramid=pyramid):
+            if "image" in result and result["image"].startswith(os.sep) and BATCH_ROOT:
+                result["image"] = os.path.relpath(result["image"], os.path.realpath(BATCH_ROOT))
+            yield json.dumps(result) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue an upload for the CV worker pool. Returns 202 with a job ID to poll,
+    or 503 with Retry-After when the queue is full.
+    """
+    file = request.files.get('file')
+    image_bytes = file.read() if file else request.get_data()
+    if not image_bytes:
+        return jsonify({"message": "No image provided"}), 400
+
+    output = request.values.get('output', 'scene').lower()
+    if output not in SCENE_OUTPUTS:
+        return jsonify({"message": f"output must be one of {', '.join(SCENE_OUTPUTS)}"}), 400
+
+    session_id = get_session_id() or table_cache.new_session_id()
+    try:
+        job_id = upload_jobs.submit(image_bytes, parse_pyramid(request.values.get('pyramid')),
+                                    request.values.get('camera_id'), output, meta={"session_id": session_id})
+    except QueueFullError as e:
+        return jsonify({"message": str(e), **upload_jobs.stats()}), 503, {"Retry-After": "1"}
+    return jsonify({"job_id": job_id, "status": "queued", "session_id": session_id}), 202, \
+        {"Location": f"/jobs/{job_id}"}
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status, timing and (once done) result; ?wait=<seconds> long-polls until it finishes."""
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        return jsonify({"message": "wait must be a number"}), 400
+    job = upload_jobs.get(job_id, wait=wait)
+    if job is None:
+        return jsonify({"message": f"Unknown or expired job {job_id}"}), 404
+    return jsonify(job), 200
+
+
+@app.route('/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify(upload_jobs.stats()), 200
+
+
+def process_live_frame(frame, options, state):
+    """
+    Headless pipeline for one live frame: ball positions plus an optional shot
+    path. Each stream keeps its own BallTracker so balls keep their IDs and
+    full circle detection only runs on keyframes.
+
+    Calibration is saved under the stream's camera_id when the client names
+    one; otherwise it is kept in memory under the stream ID only, since stream
+    IDs do not outlive the stream.
+    """
+    if options.get('camera_id'):
+        camera_id, calibration = options['camera_id'], calibration_store
+    else:
+        camera_id, calibration = options.get('stream_id'), stream_calibration
+    tracker = state.setdefault('tracker', BallTracker())
+    with frame_buffers.lease():
+        _, _, _, table = getCueTips(frame, run_sim=False, pyramid='auto', camera_id=camera_id,
+                                    calibration=calibration, tracker=tracker, render=False)
+    result = {**table_to_json(table), "keyframes": tracker.keyframes}
+    if options.get('cue_angle') is not None and len(table):
+        segments, _ = main(table, cue_angle=options['cue_angle'], show_simulation=False, engine='event',
+                           speed=options.get('speed'), seed=0)
+        result["paths"] = paths_to_polylines(segments)
+    return result
+
+
+live_streams = LiveStreamManager(process_live_frame)
+
+
+@app.route('/stream/<stream_id>/frames', methods=['POST'])
+def stream_frames(stream_id):
+    """
+    Ingest frames for a live stream. The body is either one JPEG (image/jpeg)
+    or a chunked stream of 4-byte big-endian length-prefixed JPEG frames. A
+    camera_id query parameter names the physical camera, so its calibration
+    is saved and reused by later streams.
+    """
+    try:
+        session = live_streams.get(stream_id)
+        session.options['stream_id'] = stream_id
+        if request.args.get('camera_id'):
+            session.options['camera_id'] = request.args['camera_id']
+        if request.mimetype == 'image/jpeg':
+            session.push(request.get_data())
+        else:
+            for frame in read_frames(request.stream):
+                session.push(frame)
+        return jsonify(session.stats()), 200
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": f"Error ingesting stream: {str(e)}"}), 500
+
+
+@app.route('/stream/<stream_id>/events', methods=['GET'])
+def stream_events(stream_id):
+    """Server-sent events with the newest ball positions and shot paths for a stream."""
+    shot = {}
+    try:
+        for name in ('cue_angle', 'speed'):
+            if request.args.get(name) is not None:
+                shot[name] = float(request.args[name])
+    except ValueError as e:
+        return jsonify({"message": f"Invalid stream parameters: {str(e)}"}), 400
+    session = live_streams.get(stream_id)
+    session.options['stream_id'] = stream_id
+    if request.args.get('camera_id'):
+        session.options['camera_id'] = request.args['camera_id']
+    session.options.update(shot)
+    return Response(stream_with_context(sse_events(session)), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route('/stream/<stream_id>/stats', methods=['GET'])
+def stream_stats(stream_id):
+    session = live_streams.get(stream_id, create=False)
+    if session is None:
+        return jsonify({"message": f"No live stream {stream_id}"}), 404
+    return jsonify(session.stats()), 200
+
+
+@app.route('/calibration/<camera_id>', methods=['DELETE'])
+def reset_calibration(camera_id):
+    calibration_store.discard(camera_id)
+    stream_calibration.discard(camera_id)
+    return jsonify({"message": f"Calibration for {camera_id} cleared"}), 200
+
+
 @app.route('/sim', methods=['POST'])
 def sim_angle():
-    global sim_env_data
     try:
-        if not sim_env_data:
+        request_data = request.get_json()
+        sim_env_data = table_cache.get(get_session_id(request_data))
+        if sim_env_data is None:
             return jsonify({"message": "Simulation environment data not initialized"}), 400
 
-        request_data = request.get_json()
         cue_angle = request_data.get('cue_angle')
         if cue_angle is None:
             return jsonify({"message": "Missing cue_angle in request"}), 400
 
-        pool_balls, edges, avg_radius = sim_env_data
-        tempfile_svg_name, cue_ball_pos_start = main(pool_balls, wall_cords=edges, ball_radius=avg_radius, cue_angle=cue_angle, show_simulation=False)
-        with open(tempfile_svg_name, 'r') as f:
-            svg_content = f.read()
-        print(type(svg_content))
-        os.remove(tempfile_svg_name)  # Clean up temporary file
-        
+        engine = request_data.get('engine', 'step')
+        if engine not in ('step', 'event'):
+            return jsonify({"message": f"Unknown engine: {engine}"}), 400
+
+        path_format = request_data.get('format', 'svg')
+        if path_format not in PATH_FORMATS:
+            return jsonify({"message": f"Unknown format: {path_format}"}), 400
+
+        seed = request_data.get('seed')
+        if not valid_seed(seed):
+            return jsonify({"message": "seed must be an integer or a string"}), 400
+        try:
+            cue_angle = float(cue_angle)
+            speed = request_data.get('speed')
+            speed = None if speed is None else float(speed)
+            # Step-engine trajectories are simplified to within tolerance pixels, optionally capped per ball
+            path_tolerance = float(request_data.get('tolerance', DEFAULT_TOLERANCE))
+            max_path_points = request_data.get('max_points')
+            max_path_points = None if max_path_points is None else max(2, int(max_path_points))
+            # Clients may tighten the per-shot budget but never loosen it
+            time_budget = min(float(request_data.get('time_budget', TIME_BUDGET)), TIME_BUDGET)
+        except (TypeError, ValueError) as e:
+            return jsonify({"message": f"Invalid simulation parameters: {str(e)}"}), 400
+        if path_tolerance < 0:
+            return jsonify({"message": "tolerance must not be negative"}), 400
+
+        def run_shot():
+            stats = {}
+            segments, cue_ball_pos_start = main(sim_env_data, cue_angle=cue_angle, show_simulation=False, engine=engine,
+                                                speed=speed, seed=seed, time_budget=time_budget, stats=stats,
+                                                path_tolerance=path_tolerance, max_path_points=max_path_points)
+            return segments, cue_ball_pos_start, stats
+
+        if speed is None and seed is None:
+            segments, cue_ball_pos_start, stats = run_shot()  # Random speed: nothing to reuse
+        else:
+            key = shot_key(sim_env_data, cue_angle=cue_angle, engine=engine, speed=speed, seed=seed,
+                           tolerance=path_tolerance, max_points=max_path_points)
+            # Never replay a cut-short shot
+            segments, cue_ball_pos_start, stats = shot_cache.get_or_run(
+                key, run_shot, cacheable=lambda result: result[2]["truncated"] is None)
+        WIDTH, HEIGHT = sim_env_data.table_size
+        with timed("serialize"):
+            paths = serialize_paths(segments, path_format, WIDTH, HEIGHT)
+
         startX = int(cue_ball_pos_start[0])
         startY = int(cue_ball_pos_start[1])
-        return jsonify({"svg": svg_content, "Cue": (startX, startY)}), 200
+        if path_format == 'binary':
+            # Packed float32 rows of (x1, y1, x2, y2, r, g, b); metadata travels in headers
+            return Response(paths, mimetype='application/octet-stream', headers={
+                "X-Cue": f"{startX},{startY}",
+                "X-Table-Size": f"{WIDTH},{HEIGHT}",
+                "X-Sim-Steps": str(stats["steps"]),
+                "X-Sim-Truncated": stats["truncated"] or "",
+            })
+        body = {"Cue": (startX, startY), "steps": stats["steps"], "truncated": stats["truncated"]}
+        body["paths" if path_format == 'json' else "svg"] = paths
+        return jsonify(body), 200
     except Exception as e:
         return jsonify({"message": f"Error running simulation: {str(e)}"}), 500
 
 
+@app.route('/sim/stream', methods=['GET', 'POST'])
+def sim_stream():
+    """
+    Server-sent events with a shot's ball positions as it is simulated: a
+    "start" event with every ball, delta-encoded "frame" events at the
+    requested fps of simulated time, then "end" with the paths. Parameters come
+    from the JSON body, or the query string so EventSource can be used. A newer
+    stream for the same session, or the client disconnecting, cancels the shot.
+    """
+    try:
+        request_data = request.get_json(silent=True) or request.args.to_dict()
+        session_id = get_session_id(request_data)
+        sim_env_data = table_cache.get(session_id)
+        if sim_env_data is None:
+            return jsonify({"message": "Simulation environment data not initialized"}), 400
+
+        try:
+            cue_angle = float(request_data['cue_angle'])
+            speed = request_data.get('speed')
+            speed = None if speed is None else float(speed)
+            fps = int(request_data.get('fps', DEFAULT_FPS))
+            path_tolerance = float(request_data.get('tolerance', DEFAULT_TOLERANCE))
+            time_budget = min(float(request_data.get('time_budget', TIME_BUDGET)), TIME_BUDGET)
+        except KeyError:
+            return jsonify({"message": "Missing cue_angle in request"}), 400
+        except (TypeError, ValueError) as e:
+            return jsonify({"message": f"Invalid stream parameters: {str(e)}"}), 400
+        if fps < 1 or path_tolerance < 0:
+            return jsonify({"message": "fps must be positive and tolerance not negative"}), 400
+        if not valid_seed(request_data.get('seed')):
+            return jsonify({"message": "seed must be an integer or a string"}), 400
+
+        cancel = shot_streams.start(session_id)
+
+        def generate():
+            try:
+                for event, payload in stream_shot(sim_env_data, cue_angle, speed=speed, seed=request_data.get('seed'),
+                                                  fps=fps, cancel=cancel, time_budget=time_budget,
+                                                  path_tolerance=path_tolerance):
+                    yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+            finally:
+                cancel.set()
+                shot_streams.finish(session_id, cancel)
+
+        return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    except Exception as e:
+        return jsonify({"message": f"Error streaming simulation: {str(e)}"}), 500
+
+
+@app.route('/sim/cache', methods=['GET'])
+def sim_cache_stats():
+    return jsonify(shot_cache.stats()), 200
+
+
+@app.route('/sim/sweep', methods=['POST'])
+def sim_sweep():
+    try:
+        request_data = request.get_json() or {}
+        sim_env_data = table_cache.get(get_session_id(request_data))
+        if sim_env_data is None:
+            return jsonify({"message": "Simulation environment data not initialized"}), 400
+
+        try:
+            shots = build_shots(
+                request_data.get('angle_start', 0),
+                request_data.get('angle_end', 360),
+                request_data.get('angle_step', 1),
+                request_data.get('speeds'),
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({"message": f"Invalid sweep parameters: {str(e)}"}), 400
+
+        results = sweep_pool.sweep(shots, table=sim_env_data)
+        paths = [{
+            "angle": r["angle"],
+            "speed": r["speed"],
+            "potted": r["potted"],
+            "scratch": r["scratch"],
+            "paths": paths_to_polylines(segments_to_array(r["collisions"])),
+        } for r in results]
+        return jsonify({"paths": paths, "ranking": rank_results(results)}), 200
+    except Exception as e:
+        return jsonify({"message": f"Error running sweep: {str(e)}"}), 500
+
+
+@app.route('/sim/solve', methods=['POST'])
+def sim_solve():
+    try:
+        request_data = request.get_json() or {}
+        sim_env_data = table_cache.get(get_session_id(request_data))
+        if sim_env_data is None:
+            return jsonify({"message": "Simulation environment data not initialized"}), 400
+
+        try:
+            result = solve_shot(
+                sim_env_data,
+                target=request_data['target'],
+                pocket=request_data.get('pocket'),
+                speeds=request_data.get('speeds') or SOLVER_SPEEDS,
+                max_candidates=int(request_data.get('max_candidates', 5)),
+                simulate=lambda shots: sweep_pool.sweep(shots, table=sim_env_data),
+            )
+        except KeyError:
+            return jsonify({"message": "target is required (a ball index or an [r, g, b] colour)"}), 400
+        except (TypeError, ValueError) as e:
+            return jsonify({"message": f"Invalid solve parameters: {str(e)}"}), 400
+
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"message": f"Error solving shot: {str(e)}"}), 500
+
+
+@app.route('/sim/robustness', methods=['POST'])
+def sim_robustness():
+    try:
+        request_data = request.get_json() or {}
+        sim_env_data = table_cache.get(get_session_id(request_data))
+        if sim_env_data is None:
+            return jsonify({"message": "Simulation environment data not initialized"}), 400
+
+        cue_angle = request_data.get('cue_angle')
+        if cue_angle is None:
+            return jsonify({"message": "Missing cue_angle in request"}), 400
+
+        try:
+            noise = {name: float(request_data[name]) for name in ('angle_sigma', 'speed_sigma', 'position_sigma')
+                     if name in request_data}
+            result = estimate_robustness(
+                sim_env_data,
+                angle=float(cue_angle),
+                speed=float(request_data.get('speed', DEFAULT_SPEED)),
+                samples=int(request_data.get('samples', DEFAULT_SAMPLES)),
+                seed=request_data.get('seed'),
+                # Clients may tighten the budget but never loosen it
+                time_budget=min(float(request_data.get('time_budget', ROBUSTNESS_BUDGET)), ROBUSTNESS_BUDGET),
+                batch_size=max(BATCH_SIZE, 32 * sweep_pool.workers),
+                simulate=lambda shots, starts, deadline: sweep_pool.sweep(shots, table=sim_env_data, starts=starts,
+                                                                          deadline=deadline),
+                **noise,
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({"message": f"Invalid robustness parameters: {str(e)}"}), 400
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"message": f"Error estimating robustness: {str(e)}"}), 500
+
+
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0", port=4000)